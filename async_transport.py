@@ -0,0 +1,78 @@
+"""In-process asyncio transport: one bounded asyncio.Queue inbox per person.
+
+send() waits while the receiver's inbox is full, so slow readers slow
+down their senders. receive() records the end-to-end latency from send
+to receipt.
+"""
+import asyncio
+import time
+from array import array
+from collections import namedtuple
+from typing import AsyncIterator, Dict, Optional, Union
+
+from structures import CommunicationNetwork, CompactMessage, Message
+
+LatencyStats = namedtuple("LatencyStats", ["count", "mean", "p50", "p99", "max"])
+
+class InProcessTransport:
+    def __init__(self, network: Optional[CommunicationNetwork] = None, maxsize: int = 1024):
+        """With a network, sends to people outside it raise ValueError; maxsize bounds every inbox."""
+        if maxsize <= 0:
+            raise ValueError("Inbox maxsize must be positive.")
+        self.network = network
+        self.maxsize = maxsize
+        self._inboxes: Dict[str, asyncio.Queue] = {}
+        # Seconds from send() to receive(), in receipt order
+        self._latencies = array("d")
+
+    def inbox(self, person_id: str) -> asyncio.Queue:
+        queue = self._inboxes.get(person_id)
+        if queue is None:
+            if self.network is not None and self.network.get_person(person_id) is None:
+                raise ValueError(f"{person_id} is not in the network.")
+            queue = self._inboxes[person_id] = asyncio.Queue(self.maxsize)
+        return queue
+
+    async def send(self, message: Union[Message, CompactMessage]):
+        """Deliver to the receiver's inbox, waiting for space if it is full."""
+        await self.inbox(_receiver_id(message)).put((time.perf_counter(), message))
+
+    def send_nowait(self, message: Union[Message, CompactMessage]):
+        """Deliver without waiting; raises asyncio.QueueFull if the receiver's inbox is full."""
+        self.inbox(_receiver_id(message)).put_nowait((time.perf_counter(), message))
+
+    async def receive(self, person_id: str, timeout: Optional[float] = None) -> Union[Message, CompactMessage]:
+        """Take the next message for person_id; raises asyncio.TimeoutError after timeout seconds."""
+        queue = self.inbox(person_id)
+        if timeout is None:
+            sent_at, message = await queue.get()
+        else:
+            sent_at, message = await asyncio.wait_for(queue.get(), timeout)
+        self._latencies.append(time.perf_counter() - sent_at)
+        return message
+
+    async def messages(self, person_id: str) -> AsyncIterator[Union[Message, CompactMessage]]:
+        """Yield person_id's messages as they arrive, forever."""
+        while True:
+            yield await self.receive(person_id)
+
+    def pending(self, person_id: Optional[str] = None) -> int:
+        """Messages waiting in one inbox, or in all of them."""
+        if person_id is not None:
+            queue = self._inboxes.get(person_id)
+            return queue.qsize() if queue is not None else 0
+        return sum(queue.qsize() for queue in self._inboxes.values())
+
+    def latency_stats(self) -> LatencyStats:
+        if not self._latencies:
+            return LatencyStats(0, 0.0, 0.0, 0.0, 0.0)
+        ordered = sorted(self._latencies)
+        count = len(ordered)
+        return LatencyStats(count, sum(ordered) / count, ordered[count // 2],
+                            ordered[min(count - 1, int(count * 0.99))], ordered[-1])
+
+    def reset_latencies(self):
+        self._latencies = array("d")
+
+def _receiver_id(message: Union[Message, CompactMessage]) -> str:
+    return message.receiver.id if isinstance(message, Message) else message.receiver_id
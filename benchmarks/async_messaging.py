@@ -0,0 +1,64 @@
+"""Run many concurrent send/receive coroutines over the in-process asyncio transport.
+
+Usage: python benchmarks/async_messaging.py [--people N] [--messages-per-person K] [--inbox-size Q]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_transport import InProcessTransport
+from structures import CompactMessage, CompactMessageMetadata, MessageType
+
+
+async def simulate(people: int, messages_per_person: int, inbox_size: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    person_ids = [f"p{i}" for i in range(people)]
+    # Each person receives exactly messages_per_person messages: a shuffled round-robin
+    destinations = [person_ids[:] for _ in range(messages_per_person)]
+    for row in destinations:
+        rng.shuffle(row)
+    transport = InProcessTransport(maxsize=inbox_size)
+    metadata = CompactMessageMetadata(MessageType.PLAIN)
+
+    async def sender(index: int):
+        for row in destinations:
+            await transport.send(CompactMessage(person_ids[index], row[index], metadata, b"x" * 64))
+
+    async def receiver(person_id: str):
+        for _ in range(messages_per_person):
+            await transport.receive(person_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(receiver(person_id) for person_id in person_ids),
+                         *(sender(index) for index in range(people)))
+    elapsed = time.perf_counter() - start
+
+    stats = transport.latency_stats()
+    return {
+        "coroutines": 2 * people,
+        "messages": stats.count,
+        "elapsed_s": elapsed,
+        "messages_per_s": stats.count / elapsed,
+        "latency_mean_ms": stats.mean * 1e3,
+        "latency_p50_ms": stats.p50 * 1e3,
+        "latency_p99_ms": stats.p99 * 1e3,
+        "latency_max_ms": stats.max * 1e3,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--people", type=int, default=20000)
+    parser.add_argument("--messages-per-person", type=int, default=10)
+    parser.add_argument("--inbox-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=311)
+    args = parser.parse_args()
+
+    results = asyncio.run(simulate(args.people, args.messages_per_person, args.inbox_size, args.seed))
+    for name, value in results.items():
+        print(f"{name:<18}{value:>14.2f}")
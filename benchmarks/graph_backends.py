@@ -0,0 +1,93 @@
+"""Compare memory use and lookup latency of the CommunicationNetwork graph backends.
+
+Usage: python benchmarks/graph_backends.py [--people N] [--edges-per-person M] [--queries Q]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from structures import CommunicationNetwork, Person
+
+
+def build_network(backend: str, people: int, edges_per_person: int, seed: int) -> CommunicationNetwork:
+    """Build a synthetic scale-free (preferential attachment) network."""
+    rng = random.Random(seed)
+    network = CommunicationNetwork(backend=backend)
+    network.add_people_bulk(Person(f"p{i}") for i in range(people))
+    connections = []
+    targets = []
+    for i in range(people):
+        person_id = f"p{i}"
+        for target in {rng.choice(targets) for _ in range(edges_per_person)} if targets else ():
+            connections.append((person_id, target))
+            targets.append(target)
+        targets.append(person_id)
+    network.add_connections_bulk(connections)
+    # Bulk loading defers the connectivity index; count its rebuild as part of loading
+    network.are_connected("p0", "p0")
+    return network
+
+
+def time_queries(network: CommunicationNetwork, pairs) -> dict:
+    start = time.perf_counter()
+    for person1_id, person2_id in pairs:
+        network.are_connected(person1_id, person2_id)
+    connected = time.perf_counter() - start
+
+    # Start from an empty route cache; sources seen once are served by a bidirectional search
+    network.clear_route_cache()
+    start = time.perf_counter()
+    for person1_id, person2_id in pairs:
+        network.get_path(person1_id, person2_id)
+    cold = time.perf_counter() - start
+
+    # Relay-style traffic from a few repeating sources, whose trees are cached on their second miss
+    sources = [source for source, _ in pairs[:8]]
+    warm_pairs = [(sources[index % len(sources)], target) for index, (_, target) in enumerate(pairs)]
+    for person1_id, person2_id in warm_pairs[:2 * len(sources)]:
+        network.get_path(person1_id, person2_id)
+    start = time.perf_counter()
+    for person1_id, person2_id in warm_pairs:
+        network.get_path(person1_id, person2_id)
+    warm = time.perf_counter() - start
+
+    return {
+        "are_connected_us": connected / len(pairs) * 1e6,
+        "get_path_cold_us": cold / len(pairs) * 1e6,
+        "get_path_warm_us": warm / len(pairs) * 1e6,
+    }
+
+
+def run(people: int, edges_per_person: int, queries: int, seed: int = 311) -> dict:
+    rng = random.Random(seed)
+    pairs = [(f"p{rng.randrange(people)}", f"p{rng.randrange(people)}") for _ in range(queries)]
+    results = {}
+    for backend in ("networkx", "csr"):
+        tracemalloc.start()
+        start = time.perf_counter()
+        network = build_network(backend, people, edges_per_person, seed)
+        build_seconds = time.perf_counter() - start
+        graph_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[backend] = {"build_s": build_seconds, "memory_mb": graph_bytes / 2**20}
+        results[backend].update(time_queries(network, pairs))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--people", type=int, default=20000)
+    parser.add_argument("--edges-per-person", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    results = run(args.people, args.edges_per_person, args.queries)
+    columns = ["build_s", "memory_mb", "are_connected_us", "get_path_cold_us", "get_path_warm_us"]
+    print(f"{'backend':<10}" + "".join(f"{column:>18}" for column in columns))
+    for backend, row in results.items():
+        print(f"{backend:<10}" + "".join(f"{row[column]:>18.2f}" for column in columns))
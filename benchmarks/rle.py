@@ -0,0 +1,64 @@
+"""Compare throughput of the vectorized and pure-Python RLE codecs in victor/.
+
+Usage: python benchmarks/rle.py [--sizes 1000 100000 ...] [--repeat R]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "victor"))
+
+from compressed_messages import rle_encode, rle_decode, rle_encode_python, rle_decode_python
+
+
+def make_payload(size: int, seed: int = 311) -> str:
+    """Log-like text: short words mixed with long runs of padding characters."""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        part = rng.choice(["INFO", "WARN", "sensor", "ok", "-" * rng.randrange(1, 80), " " * rng.randrange(1, 40)])
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)[:size]
+
+
+def throughput(func, payload: str, repeat: int) -> float:
+    """Best-of-repeat throughput in MB/s of input characters."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(payload)
+        best = min(best, time.perf_counter() - start)
+    return len(payload) / best / 1e6
+
+
+def run(sizes, repeat: int) -> list:
+    rows = []
+    for size in sizes:
+        payload = make_payload(size)
+        encoded = rle_encode_python(payload)
+        assert rle_encode(payload) == encoded
+        rows.append({
+            "size": size,
+            "encode_python_mbs": throughput(rle_encode_python, payload, repeat),
+            "encode_numpy_mbs": throughput(rle_encode, payload, repeat),
+            "decode_python_mbs": throughput(rle_decode_python, encoded, repeat),
+            "decode_numpy_mbs": throughput(rle_decode, encoded, repeat),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 4_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = run(args.sizes, args.repeat)
+    columns = ["encode_python_mbs", "encode_numpy_mbs", "decode_python_mbs", "decode_numpy_mbs"]
+    print(f"{'size':>10}" + "".join(f"{column:>20}" for column in columns))
+    for row in rows:
+        print(f"{row['size']:>10}" + "".join(f"{row[column]:>20.2f}" for column in columns))
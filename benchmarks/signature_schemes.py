@@ -0,0 +1,58 @@
+"""Compare key generation, signing and verification speed of the SignedMessenger algorithms.
+
+Usage: python benchmarks/signature_schemes.py [--messages N] [--keys K]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lionel"))
+
+from structures import CommunicationNetwork, Person
+from signed_messages import SignedMessenger, SIGNATURE_ALGORITHMS
+
+
+def run(messages: int, keys: int) -> list:
+    rows = []
+    for algorithm in SIGNATURE_ALGORITHMS:
+        network = CommunicationNetwork()
+        messenger = SignedMessenger(network)
+
+        start = time.perf_counter()
+        for _ in range(keys):
+            private_key, public_key = messenger.generate_key_pair(algorithm)
+        keygen_ms = (time.perf_counter() - start) / keys * 1e3
+
+        network.add_person(Person("sender", public_key=public_key, private_key=private_key))
+        network.add_person(Person("receiver"))
+
+        start = time.perf_counter()
+        signed = [messenger.send_signed_message("sender", "receiver", f"Notification {i}") for i in range(messages)]
+        sign_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        assert all(messenger.verify_received_message(message) for message in signed)
+        verify_seconds = time.perf_counter() - start
+
+        rows.append({
+            "algorithm": algorithm,
+            "keygen_ms": keygen_ms,
+            "sign_per_s": messages / sign_seconds,
+            "verify_per_s": messages / verify_seconds,
+            "signature_bytes": len(signed[0].metadata.signature),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--keys", type=int, default=10)
+    args = parser.parse_args()
+
+    rows = run(args.messages, args.keys)
+    columns = ["keygen_ms", "sign_per_s", "verify_per_s", "signature_bytes"]
+    print(f"{'algorithm':<12}" + "".join(f"{column:>17}" for column in columns))
+    for row in rows:
+        print(f"{row['algorithm']:<12}" + "".join(f"{row[column]:>17.1f}" for column in columns))
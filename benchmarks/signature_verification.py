@@ -0,0 +1,55 @@
+"""Measure how SignedMessenger.verify_batch throughput scales with worker count.
+
+Usage: python benchmarks/signature_verification.py [--messages N] [--senders S] [--workers 1 2 4 ...]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lionel"))
+
+from structures import CommunicationNetwork, Person
+from signed_messages import SignedMessenger
+
+
+def build_messages(count: int, senders: int):
+    network = CommunicationNetwork()
+    messenger = SignedMessenger(network)
+    network.add_person(Person("gateway"))
+    for i in range(senders):
+        private_key, public_key = messenger.generate_key_pair()
+        network.add_person(Person(f"sender{i}", public_key=public_key, private_key=private_key))
+    messages = [
+        messenger.send_signed_message(f"sender{i % senders}", "gateway", f"Notification {i}")
+        for i in range(count)
+    ]
+    return messenger, messages
+
+
+def run(count: int, senders: int, worker_counts, use_processes: bool) -> list:
+    messenger, messages = build_messages(count, senders)
+
+    start = time.perf_counter()
+    assert all(messenger.verify_received_message(message) for message in messages)
+    rows = [{"workers": "sequential", "messages_per_s": count / (time.perf_counter() - start)}]
+
+    for workers in worker_counts:
+        start = time.perf_counter()
+        assert all(messenger.verify_batch(messages, workers=workers, use_processes=use_processes))
+        rows.append({"workers": workers, "messages_per_s": count / (time.perf_counter() - start)})
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--senders", type=int, default=20)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--processes", action="store_true", help="use a process pool instead of threads")
+    args = parser.parse_args()
+
+    rows = run(args.messages, args.senders, args.workers, args.processes)
+    print(f"{'workers':>12}{'messages/s':>16}")
+    for row in rows:
+        print(f"{row['workers']:>12}{row['messages_per_s']:>16.0f}")
@@ -0,0 +1,291 @@
+"""Run the micro-benchmark suite over every hot path and optionally compare against a baseline.
+
+Usage: python benchmarks/suite.py [--only NAME ...] [--payload-sizes N ...] [--graph-sizes N ...]
+                                  [--backend networkx|csr] [--repeat R] [--output results.json]
+                                  [--baseline baseline.json] [--threshold 0.1]
+
+Exits with status 1 when --baseline is given and any benchmark is slower
+than the baseline by more than the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+for folder in ("victor", "kaena", "lionel", "matthew"):
+    sys.path.append(os.path.join(ROOT, folder))
+
+import numpy as np
+
+from compressed_messages import (rle_decode, rle_decode_numpy, rle_decode_python, rle_encode, rle_encode_numpy,
+                                 rle_encode_python)
+from fft_compressed_communication import fft_compress_message
+from graph_backends import build_network
+from rle import make_payload
+from send_message import EncryptedMessenger, generate_rsa_keys
+from signed_messages import SignedMessenger
+from structures import CommunicationNetwork, MessageMetadata, MessageType, Person
+
+# Each benchmark takes a size and returns a zero-argument callable to time
+PAYLOAD_BENCHMARKS: Dict[str, Callable[[int], Callable[[], object]]] = {}
+GRAPH_BENCHMARKS: Dict[str, Callable[[CommunicationNetwork, int], Callable[[], object]]] = {}
+
+
+def payload_benchmark(func):
+    PAYLOAD_BENCHMARKS[func.__name__] = func
+    return func
+
+
+def graph_benchmark(func):
+    GRAPH_BENCHMARKS[func.__name__] = func
+    return func
+
+
+@payload_benchmark
+def rle_encode_text(size: int):
+    payload = make_payload(size)
+    return lambda: rle_encode(payload)
+
+
+@payload_benchmark
+def rle_decode_text(size: int):
+    encoded = rle_encode(make_payload(size))
+    return lambda: rle_decode(encoded)
+
+
+# Both implementations at every size; their crossover sets the VECTORIZE_*_MIN_LENGTH thresholds
+@payload_benchmark
+def rle_encode_numpy_path(size: int):
+    payload = make_payload(size)
+    return lambda: rle_encode_numpy(payload)
+
+
+@payload_benchmark
+def rle_encode_python_path(size: int):
+    payload = make_payload(size)
+    return lambda: rle_encode_python(payload)
+
+
+@payload_benchmark
+def rle_decode_numpy_path(size: int):
+    encoded = rle_encode(make_payload(size))
+    return lambda: rle_decode_numpy(encoded)
+
+
+@payload_benchmark
+def rle_decode_python_path(size: int):
+    encoded = rle_encode(make_payload(size))
+    return lambda: rle_decode_python(encoded)
+
+
+@payload_benchmark
+def fft_compress(size: int):
+    payload = make_payload(size)
+    return lambda: fft_compress_message(payload, 0.5)
+
+
+def _signing_setup(size: int):
+    network = CommunicationNetwork()
+    messenger = SignedMessenger(network)
+    private_key, public_key = messenger.generate_key_pair()
+    network.add_person(Person("alice", public_key=public_key, private_key=private_key))
+    network.add_person(Person("bob"))
+    return messenger, make_payload(size)
+
+
+@payload_benchmark
+def sign(size: int):
+    messenger, payload = _signing_setup(size)
+    return lambda: messenger.send_signed_message("alice", "bob", payload)
+
+
+@payload_benchmark
+def verify(size: int):
+    messenger, payload = _signing_setup(size)
+    message = messenger.send_signed_message("alice", "bob", payload)
+    return lambda: messenger.verify_received_message(message)
+
+
+_RSA_KEYS = []
+
+
+def _encryption_setup(size: int):
+    # RSA key generation would dominate the setup of every size
+    if not _RSA_KEYS:
+        _RSA_KEYS.extend([generate_rsa_keys(), generate_rsa_keys()])
+    (alice_private, alice_public), (bob_private, bob_public) = _RSA_KEYS
+    alice = Person("alice", public_key=alice_public, private_key=alice_private)
+    bob = Person("bob", public_key=bob_public, private_key=bob_private)
+    return EncryptedMessenger(CommunicationNetwork()), alice, bob, make_payload(size)
+
+
+@payload_benchmark
+def encrypt(size: int):
+    messenger, alice, bob, payload = _encryption_setup(size)
+    metadata = MessageMetadata(MessageType.PLAIN)
+    return lambda: messenger.encrypt_message(alice, bob, metadata, payload, mode="hybrid")
+
+
+@payload_benchmark
+def decrypt(size: int):
+    messenger, alice, bob, payload = _encryption_setup(size)
+    message = messenger.encrypt_message(alice, bob, MessageMetadata(MessageType.PLAIN), payload, mode="hybrid")
+    return lambda: messenger.decrypt_message(bob, message)
+
+
+def _random_pairs(size: int, seed: int = 311, sources: Optional[List[str]] = None):
+    rng = random.Random(seed)
+    while True:
+        source = rng.choice(sources) if sources else f"p{rng.randrange(size)}"
+        yield source, f"p{rng.randrange(size)}"
+
+
+@graph_benchmark
+def get_path_cold(network: CommunicationNetwork, size: int):
+    pairs = _random_pairs(size)
+
+    def query():
+        network.clear_route_cache()
+        return network.get_path(*next(pairs))
+    return query
+
+
+@graph_benchmark
+def get_path_warm(network: CommunicationNetwork, size: int):
+    # A handful of sources, as a relay would see, so the route cache stays warm
+    sources = [f"p{index}" for index in random.Random(311).sample(range(size), min(8, size))]
+    # Each source's tree is cached on its second miss; pay for that outside the timing
+    for source in sources * 2:
+        network.get_path(source, source)
+    pairs = _random_pairs(size, sources=sources)
+    return lambda: network.get_path(*next(pairs))
+
+
+@graph_benchmark
+def are_connected(network: CommunicationNetwork, size: int):
+    pairs = _random_pairs(size)
+    return lambda: network.are_connected(*next(pairs))
+
+
+@graph_benchmark
+def add_connection(network: CommunicationNetwork, size: int):
+    pairs = _random_pairs(size, seed=312)
+    return lambda: network.add_connection(*next(pairs))
+
+
+@graph_benchmark
+def add_connections_bulk(network: CommunicationNetwork, size: int):
+    # Small batches, so a load that re-merges earlier batches grows quadratically with size
+    edges = np.array(list(network.graph.edges), dtype=str)
+    people = list(network.people.values())
+
+    def load():
+        fresh = CommunicationNetwork(backend=network.backend)
+        fresh.add_people_bulk(people)
+        return fresh.add_connections_bulk(edges, batch_size=10_000)
+    return load
+
+
+def measure(func: Callable[[], object], repeat: int, min_time: float = 0.2) -> float:
+    """Best-of-repeat seconds per call, with the loop count calibrated so each repeat takes min_time."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def run(only: Optional[List[str]], payload_sizes: List[int], graph_sizes: List[int], backend: str,
+        repeat: int) -> dict:
+    selected = set(only or list(PAYLOAD_BENCHMARKS) + list(GRAPH_BENCHMARKS))
+    unknown = selected - set(PAYLOAD_BENCHMARKS) - set(GRAPH_BENCHMARKS)
+    if unknown:
+        raise SystemExit(f"Unknown benchmarks: {sorted(unknown)}")
+
+    results = []
+    for name, setup in PAYLOAD_BENCHMARKS.items():
+        if name in selected:
+            for size in payload_sizes:
+                results.append({"benchmark": name, "size": size, "seconds": measure(setup(size), repeat)})
+    graph_names = [name for name in GRAPH_BENCHMARKS if name in selected]
+    for size in graph_sizes if graph_names else ():
+        for name in graph_names:
+            # Built per benchmark because add_connection mutates the graph
+            network = build_network(backend, size, 3, seed=311)
+            results.append({"benchmark": name, "size": size, "seconds": measure(GRAPH_BENCHMARKS[name](network, size), repeat)})
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count(),
+            "backend": backend,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> List[dict]:
+    """Annotate each result with its ratio to the baseline; returns the regressions."""
+    previous = {(row["benchmark"], row["size"]): row["seconds"] for row in baseline["results"]}
+    regressions = []
+    for row in report["results"]:
+        before = previous.get((row["benchmark"], row["size"]))
+        if before:
+            row["baseline_seconds"] = before
+            row["ratio"] = row["seconds"] / before
+            row["regression"] = row["ratio"] > 1 + threshold
+            if row["regression"]:
+                regressions.append(row)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", metavar="NAME",
+                        help=f"benchmarks to run: {', '.join(list(PAYLOAD_BENCHMARKS) + list(GRAPH_BENCHMARKS))}")
+    parser.add_argument("--payload-sizes", type=int, nargs="+", default=[100, 10_000, 1_000_000])
+    parser.add_argument("--graph-sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--backend", choices=["networkx", "csr"], default="networkx")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="JSON results from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="flag a regression when slower than the baseline by more than this fraction")
+    args = parser.parse_args()
+
+    report = run(args.only, args.payload_sizes, args.graph_sizes, args.backend, args.repeat)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare(report, json.load(handle), args.threshold)
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+    print(f"{'benchmark':<24}{'size':>10}{'us/op':>14}{'baseline':>14}{'ratio':>8}")
+    for row in report["results"]:
+        baseline_us = f"{row['baseline_seconds'] * 1e6:>14.2f}" if "baseline_seconds" in row else f"{'-':>14}"
+        ratio = f"{row['ratio']:>8.2f}" if "ratio" in row else f"{'-':>8}"
+        flag = "  REGRESSION" if row.get("regression") else ""
+        print(f"{row['benchmark']:<24}{row['size']:>10}{row['seconds'] * 1e6:>14.2f}{baseline_us}{ratio}{flag}")
+    sys.exit(1 if regressions else 0)
@@ -1,5 +1,17 @@
+import asyncio
+import struct
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Sequence, Tuple
 import numpy as np
-from structures import CommunicationNetwork, Person, Message, MessageMetadata, MessageType
+from structures import CommunicationNetwork, Person, Message, MessageMetadata, MessageType, METRICS
+
+FFT_MODES = ("signal", "coefficients")
+
+# Coefficient body header: version, bits per component, original length,
+# retained coefficient count, DC term, quantization scale (little-endian)
+COEFFICIENT_HEADER = struct.Struct("<BBIIff")
+COEFFICIENT_FORMAT_VERSION = 1
+QUANTIZATION_DTYPES = {8: np.int8, 16: np.int16}
 
 # Fast Fourier Transform-based lossy compression
 def fft_compress_message(message_body: str, compression_ratio: float) -> str:
@@ -14,27 +26,124 @@ def fft_compress_message(message_body: str, compression_ratio: float) -> str:
     if not (0 < compression_ratio <= 1):
         raise ValueError("Compression ratio must be between 0 and 1.")
 
-    # Convert the message to a numerical representation
-    message_array = np.array([ord(char) for char in message_body])
+    return fft_compress_batch([message_body], compression_ratio)[0]
 
-    # Perform FFT
-    fft_result = np.fft.fft(message_array)
+def fft_compress_batch(messages: Sequence[str], compression_ratio: float) -> List[str]:
+    """
+    Compress many messages with FFT, using one rfft/irfft call per distinct message length.
+    Args:
+        messages (Sequence[str]): The original message bodies.
+        compression_ratio (float): The ratio of frequencies to retain (0 < ratio <= 1).
+    Returns:
+        List[str]: The lossy compressed messages, in input order.
+    """
+    if not (0 < compression_ratio <= 1):
+        raise ValueError("Compression ratio must be between 0 and 1.")
+
+    # Bucket by exact length; zero padding would change every message's spectrum
+    buckets: Dict[int, List[int]] = {}
+    for index, message_body in enumerate(messages):
+        buckets.setdefault(len(message_body), []).append(index)
 
-    # Zero out high-frequency components
-    cutoff = int(len(fft_result) * compression_ratio)
-    fft_result[cutoff:] = 0
+    results = [""] * len(messages)
+    for length, indices in buckets.items():
+        if length == 0:
+            continue
+        # Convert the messages to a (messages x length) numerical representation
+        with METRICS.stage("fft.to_signal", length * len(indices)):
+            joined = "".join(messages[index] for index in indices)
+            signals = np.frombuffer(joined.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+            signals = signals.reshape(len(indices), length)
 
-    # Perform inverse FFT
-    compressed_array = np.fft.ifft(fft_result).real.round().astype(int)
+        # Perform FFT, zero out high-frequency components, and invert
+        with METRICS.stage("fft.transform", length * len(indices)):
+            spectrum = np.fft.rfft(signals, axis=1) * _real_cutoff_weights(length, compression_ratio)
+            compressed = np.fft.irfft(spectrum, n=length, axis=1).round()
 
-    # Convert back to string
-    compressed_message = ''.join(chr(max(0, min(255, char))) for char in compressed_array)
+        # Convert back to strings, clamping to the 0-255 range
+        with METRICS.stage("fft.to_text", length * len(indices)):
+            text = np.clip(compressed, 0, 255).astype(np.uint8).tobytes().decode("latin-1")
+        for row, index in enumerate(indices):
+            results[index] = text[row * length:(row + 1) * length]
+    return results
 
-    return compressed_message
+def _real_cutoff_weights(length: int, compression_ratio: float) -> np.ndarray:
+    # The filter keeps bins below the cutoff of the full (two-sided) spectrum and takes the
+    # real part of the inverse; on the rfft half that means averaging each bin's mask with
+    # the mask of its mirrored negative frequency.
+    cutoff = int(length * compression_ratio)
+    bins = np.arange(length // 2 + 1)
+    return ((bins < cutoff).astype(float) + ((length - bins) % length < cutoff)) / 2
+
+def fft_encode_coefficients(message_body: str, compression_ratio: float, bits: int = 8) -> bytes:
+    """
+    Compress a message into its quantized low-frequency rfft coefficients.
+    Args:
+        message_body (str): The original message body.
+        compression_ratio (float): The ratio of rfft coefficients to retain (0 < ratio <= 1).
+        bits (int): Bits per quantized real/imaginary component (8 or 16).
+    Returns:
+        bytes: A header followed by the packed coefficients.
+    """
+    if not (0 < compression_ratio <= 1):
+        raise ValueError("Compression ratio must be between 0 and 1.")
+    if bits not in QUANTIZATION_DTYPES:
+        raise ValueError(f"Quantization bits must be one of {sorted(QUANTIZATION_DTYPES)}.")
+
+    with METRICS.stage("fft.to_signal", len(message_body)):
+        signal = np.frombuffer(message_body.encode("utf-32-le", "surrogatepass"), dtype=np.uint32).astype(np.float64)
+    if signal.size == 0:
+        return COEFFICIENT_HEADER.pack(COEFFICIENT_FORMAT_VERSION, bits, 0, 0, 0.0, 0.0)
+
+    with METRICS.stage("fft.transform", signal.size):
+        coefficients = np.fft.rfft(signal)
+    retained = max(1, int(len(coefficients) * compression_ratio))
+
+    # The DC term dwarfs the rest, so it is sent exactly and excluded from the scale
+    dc = coefficients[0].real
+    ac = coefficients[1:retained]
+    components = np.column_stack((ac.real, ac.imag)).ravel()
+    limit = np.iinfo(QUANTIZATION_DTYPES[bits]).max
+    peak = np.abs(components).max() if components.size else 0.0
+    scale = peak / limit if peak > 0 else 1.0
+    quantized = np.round(components / scale).astype(QUANTIZATION_DTYPES[bits])
+
+    header = COEFFICIENT_HEADER.pack(COEFFICIENT_FORMAT_VERSION, bits, signal.size, retained, dc, scale)
+    return header + quantized.astype(quantized.dtype.newbyteorder("<")).tobytes()
+
+def fft_decode_coefficients(body: bytes) -> str:
+    """
+    Reconstruct the (lossy) message from a body produced by fft_encode_coefficients.
+    Args:
+        body (bytes): The packed coefficient body.
+    Returns:
+        str: The reconstructed message, clamped to the 0-255 range like fft_compress_message.
+    """
+    if len(body) < COEFFICIENT_HEADER.size:
+        raise ValueError("FFT coefficient body is truncated.")
+    version, bits, length, retained, dc, scale = COEFFICIENT_HEADER.unpack_from(body)
+    if version != COEFFICIENT_FORMAT_VERSION or bits not in QUANTIZATION_DTYPES:
+        raise ValueError("Unsupported FFT coefficient body.")
+    if length == 0:
+        return ""
+
+    dtype = np.dtype(QUANTIZATION_DTYPES[bits]).newbyteorder("<")
+    components = np.frombuffer(body, dtype=dtype, offset=COEFFICIENT_HEADER.size)
+    if components.size != 2 * (retained - 1):
+        raise ValueError("FFT coefficient body does not match its header.")
+
+    coefficients = np.zeros(length // 2 + 1, dtype=np.complex128)
+    coefficients[0] = dc
+    pairs = components.astype(np.float64).reshape(-1, 2) * scale
+    coefficients[1:retained] = pairs[:, 0] + 1j * pairs[:, 1]
+    with METRICS.stage("fft.inverse_transform", length):
+        signal = np.clip(np.fft.irfft(coefficients, n=length).round(), 0, 255).astype(np.uint32)
+    with METRICS.stage("fft.to_text", length):
+        return signal.tobytes().decode("utf-32-le")
 
 # Send a lossy compressed message
 def send_compressed_message(network: CommunicationNetwork, sender_id: str, receiver_id: str, 
-                            message_body: str, compression_ratio: float):
+                            message_body: str, compression_ratio: float, mode: str = "signal"):
     """
     Send a lossy compressed message from sender to receiver using FFT compression.
 
@@ -44,6 +153,8 @@ def send_compressed_message(network: CommunicationNetwork, sender_id: str, recei
         receiver_id (str): The ID of the receiver.
         message_body (str): The original message body.
         compression_ratio (float): The compression ratio for FFT compression.
+        mode (str): "signal" sends the filtered message text; "coefficients" sends
+            only the retained rfft coefficients, which actually shrinks the body.
 
     Returns:
         Message: The message object representing the sent message.
@@ -53,13 +164,26 @@ def send_compressed_message(network: CommunicationNetwork, sender_id: str, recei
 
     if not sender or not receiver:
         raise ValueError("Sender or receiver not found in the network.")
+    if mode not in FFT_MODES:
+        raise ValueError(f"Unknown FFT mode {mode!r}; expected one of {FFT_MODES}.")
 
-    compressed_body = fft_compress_message(message_body, compression_ratio)
+    if mode == "coefficients":
+        compressed_body = fft_encode_coefficients(message_body, compression_ratio)
+        original_bytes = len(message_body.encode("utf-8"))
+        additional_data = {
+            "fft_mode": mode,
+            # Bytes on the wire per byte of UTF-8 input
+            "byte_compression_ratio": len(compressed_body) / original_bytes if original_bytes else 1.0
+        }
+    else:
+        compressed_body = fft_compress_message(message_body, compression_ratio)
+        additional_data = {"fft_mode": mode}
 
     metadata = MessageMetadata(
         message_type=MessageType.FFT_COMPRESSED,
         original_length=len(message_body),
-        compression_ratio=compression_ratio
+        compression_ratio=compression_ratio,
+        additional_data=additional_data
     )
 
     message = Message(
@@ -69,4 +193,72 @@ def send_compressed_message(network: CommunicationNetwork, sender_id: str, recei
         body=compressed_body
     )
 
-    return message
\ No newline at end of file
+    return message
+
+async def send_compressed_message_async(network: CommunicationNetwork, sender_id: str, receiver_id: str,
+                                        message_body: str, compression_ratio: float, mode: str = "signal",
+                                        executor: Optional[Executor] = None) -> Message:
+    """send_compressed_message with the FFT run in a thread executor (the loop's default if None)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, send_compressed_message, network, sender_id, receiver_id,
+                                      message_body, compression_ratio, mode)
+
+def send_compressed_batch(network: CommunicationNetwork, messages: Sequence[Tuple[str, str, str]],
+                          compression_ratio: float) -> List[Message]:
+    """
+    Send many lossy compressed messages, compressing all bodies with fft_compress_batch.
+
+    Args:
+        network (CommunicationNetwork): The communication network.
+        messages (Sequence[Tuple[str, str, str]]): (sender_id, receiver_id, message_body) tuples.
+        compression_ratio (float): The compression ratio for FFT compression.
+
+    Returns:
+        List[Message]: The sent messages, in input order.
+    """
+    people = []
+    for sender_id, receiver_id, _ in messages:
+        sender = network.get_person(sender_id)
+        receiver = network.get_person(receiver_id)
+        if not sender or not receiver:
+            raise ValueError("Sender or receiver not found in the network.")
+        people.append((sender, receiver))
+
+    compressed_bodies = fft_compress_batch([message_body for _, _, message_body in messages], compression_ratio)
+
+    return [
+        Message(
+            sender=sender,
+            receiver=receiver,
+            metadata=MessageMetadata(
+                message_type=MessageType.FFT_COMPRESSED,
+                original_length=len(message_body),
+                compression_ratio=compression_ratio,
+                additional_data={"fft_mode": "signal"}
+            ),
+            body=compressed_body
+        )
+        for (sender, receiver), (_, _, message_body), compressed_body in zip(people, messages, compressed_bodies)
+    ]
+
+def receive_compressed_message(message: Message) -> str:
+    """
+    Recover the (lossy) message text from an FFT compressed message.
+
+    Args:
+        message (Message): A message produced by send_compressed_message.
+
+    Returns:
+        str: The reconstructed message body.
+    """
+    if message.metadata.message_type != MessageType.FFT_COMPRESSED:
+        raise ValueError("Message is not FFT compressed.")
+    additional_data = message.metadata.additional_data or {}
+    if additional_data.get("fft_mode", "signal") == "coefficients":
+        return fft_decode_coefficients(message.body)
+    return message.body
+
+async def receive_compressed_message_async(message: Message, executor: Optional[Executor] = None) -> str:
+    """receive_compressed_message run in a thread executor (the loop's default if None)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, receive_compressed_message, message)
@@ -1,6 +1,17 @@
+import asyncio
 import unittest
 from structures import CommunicationNetwork, Person, MessageType
-from fft_compressed_communication import fft_compress_message, send_compressed_message
+from fft_compressed_communication import (
+    fft_compress_message,
+    send_compressed_message,
+    receive_compressed_message,
+    fft_encode_coefficients,
+    fft_decode_coefficients,
+    fft_compress_batch,
+    send_compressed_batch,
+    send_compressed_message_async,
+    receive_compressed_message_async
+)
 
 class TestFFTCompression(unittest.TestCase):
 
@@ -74,5 +85,69 @@ class TestFFTCompression(unittest.TestCase):
         self.assertNotEqual(original_message, low_compression_message.body)
         self.assertNotEqual(high_compression_message.body, low_compression_message.body)
 
+    def test_coefficient_mode_shrinks_body(self):
+        """Test that coefficient mode transmits fewer bytes than the original message."""
+        original_message = "Coefficient mode should shrink the payload. " * 10
+
+        message = send_compressed_message(
+            self.network, "Kaena", "Sylva", original_message, 0.25, mode="coefficients"
+        )
+
+        self.assertIsInstance(message.body, bytes)
+        self.assertLess(len(message.body), len(original_message.encode("utf-8")))
+        ratio = message.metadata.additional_data["byte_compression_ratio"]
+        self.assertAlmostEqual(ratio, len(message.body) / len(original_message))
+        self.assertLess(ratio, 1)
+
+        decoded = receive_compressed_message(message)
+        self.assertEqual(len(decoded), len(original_message))
+
+    def test_coefficient_round_trip_full_ratio(self):
+        """Test that keeping every coefficient at 16 bits reconstructs the message."""
+        original_message = "FFT compression test."
+        body = fft_encode_coefficients(original_message, 1.0, bits=16)
+        self.assertEqual(fft_decode_coefficients(body), original_message)
+        self.assertEqual(fft_decode_coefficients(fft_encode_coefficients("", 0.5)), "")
+
+    def test_invalid_fft_mode(self):
+        """Test that an unknown FFT mode raises an error."""
+        with self.assertRaises(ValueError):
+            send_compressed_message(self.network, "Kaena", "Sylva", "test", 0.5, mode="wavelet")
+
+    def test_batch_matches_single_messages(self):
+        """Test that batch compression gives the same result as compressing one at a time."""
+        messages = ["FFT compression test.", "", "Short", "Other message", "FFT compression tset.", "x" * 100]
+        compressed = fft_compress_batch(messages, 0.4)
+
+        self.assertEqual(len(compressed), len(messages))
+        for original_message, compressed_message in zip(messages, compressed):
+            self.assertEqual(len(compressed_message), len(original_message))
+            if original_message:
+                self.assertEqual(compressed_message, fft_compress_message(original_message, 0.4))
+
+    def test_send_compressed_batch(self):
+        """Test that batch sending builds one message per tuple with correct metadata."""
+        batch = [("Kaena", "Sylva", "First message"), ("Sylva", "Kaena", "Second, longer message")]
+        messages = send_compressed_batch(self.network, batch, 0.5)
+
+        self.assertEqual([message.sender for message in messages], [self.kaena, self.sylva])
+        for (_, _, original_message), message in zip(batch, messages):
+            self.assertEqual(message.metadata.message_type, MessageType.FFT_COMPRESSED)
+            self.assertEqual(message.metadata.original_length, len(original_message))
+            self.assertEqual(message.body, fft_compress_message(original_message, 0.5))
+
+        with self.assertRaises(ValueError):
+            send_compressed_batch(self.network, [("Kaena", "Unknown", "test")], 0.5)
+
+    def test_async_matches_sync(self):
+        """Test that the executor-backed async send matches the synchronous result."""
+        async def round_trip():
+            message = await send_compressed_message_async(self.network, "Kaena", "Sylva", "Hello async", 0.5,
+                                                          mode="coefficients")
+            return await receive_compressed_message_async(message)
+        expected = receive_compressed_message(
+            send_compressed_message(self.network, "Kaena", "Sylva", "Hello async", 0.5, mode="coefficients"))
+        self.assertEqual(asyncio.run(round_trip()), expected)
+
 if __name__ == "__main__":
     unittest.main()
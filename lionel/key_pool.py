@@ -0,0 +1,112 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Deque, Optional, Tuple
+
+from signed_messages import DEFAULT_SIGNATURE_ALGORITHM, SIGNATURE_ALGORITHMS, generate_key_pair
+
+KeyPoolMetrics = namedtuple(
+    "KeyPoolMetrics",
+    ["available", "pending", "served", "served_from_pool", "generated_inline", "generated_background", "refills", "errors"]
+)
+
+class KeyPool:
+    """Pre-generated (private PEM, public PEM) key pairs, refilled in background workers.
+
+    get() hands out a pooled pair instantly. Once the number of available plus
+    in-progress pairs drops below low_watermark, a refill up to depth is
+    scheduled. If the pool is empty, the caller generates a pair inline
+    rather than waiting.
+    """
+    def __init__(self, algorithm: str = DEFAULT_SIGNATURE_ALGORITHM, depth: int = 64,
+                 low_watermark: Optional[int] = None, workers: Optional[int] = None,
+                 use_processes: bool = True):
+        if algorithm not in SIGNATURE_ALGORITHMS:
+            raise ValueError(f"Unknown signature algorithm {algorithm!r}; expected one of {SIGNATURE_ALGORITHMS}.")
+        if depth < 1:
+            raise ValueError("Key pool depth must be at least 1.")
+        self.algorithm = algorithm
+        self.depth = depth
+        self.low_watermark = depth // 2 if low_watermark is None else low_watermark
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self._executor = executor_class(max_workers=workers)
+        self._keys: Deque[Tuple[bytes, bytes]] = deque()
+        self._lock = threading.Condition()
+        self._pending = 0
+        self._closed = False
+        self._served = 0
+        self._served_from_pool = 0
+        self._generated_inline = 0
+        self._generated_background = 0
+        self._refills = 0
+        self._errors = 0
+        self._refill()
+
+    def get(self) -> Tuple[bytes, bytes]:
+        """Return a fresh (private PEM, public PEM) pair."""
+        with self._lock:
+            key_pair = self._keys.popleft() if self._keys else None
+            self._served += 1
+            if key_pair is not None:
+                self._served_from_pool += 1
+            else:
+                self._generated_inline += 1
+        self._refill()
+        return key_pair if key_pair is not None else generate_key_pair(self.algorithm)
+
+    def wait_until_full(self, timeout: Optional[float] = None) -> bool:
+        """Block until depth pairs are available (e.g. before an onboarding burst)."""
+        with self._lock:
+            return self._lock.wait_for(lambda: len(self._keys) >= self.depth or self._closed, timeout)
+
+    def metrics(self) -> KeyPoolMetrics:
+        with self._lock:
+            return KeyPoolMetrics(
+                len(self._keys), self._pending, self._served, self._served_from_pool,
+                self._generated_inline, self._generated_background, self._refills, self._errors
+            )
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "KeyPool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _refill(self):
+        with self._lock:
+            if self._closed or len(self._keys) + self._pending >= max(self.low_watermark, 1):
+                return
+            missing = self.depth - len(self._keys) - self._pending
+            self._pending += missing
+            self._refills += 1
+        for _ in range(missing):
+            try:
+                future = self._executor.submit(generate_key_pair, self.algorithm)
+            except RuntimeError:
+                # close() shut the executor down after the check above
+                with self._lock:
+                    self._pending -= 1
+                continue
+            future.add_done_callback(self._on_generated)
+
+    def _on_generated(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self._errors += 1
+                return
+            self._keys.append(future.result())
+            self._generated_background += 1
+            self._lock.notify_all()
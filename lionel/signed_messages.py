@@ -2,82 +2,282 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import asyncio
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa, padding, utils
 from cryptography.exceptions import InvalidSignature
-from typing import Tuple, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple, Optional, Union
 
 from structures import (
     Message,
     MessageType,
     Person,
     MessageMetadata,
-    CommunicationNetwork
+    CommunicationNetwork,
+    METRICS
 )
 
-class SignedMessenger:
-    def __init__(self, network: CommunicationNetwork):
-        self.network = network
+BroadcastResult = namedtuple("BroadcastResult", ["messages", "unreachable", "tree"])
+
+KeyCacheInfo = namedtuple("KeyCacheInfo", ["hits", "misses", "evictions", "currsize", "maxsize"])
+
+class KeyCache:
+    """Bounded LRU cache of deserialized keys, keyed by a SHA-256 fingerprint of the PEM bytes."""
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._keys: "OrderedDict[Tuple[str, bytes], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def load_private_key(self, pem: bytes):
+        return self._load("private", pem, lambda: serialization.load_pem_private_key(pem, password=None))
+
+    def load_public_key(self, pem: bytes):
+        return self._load("public", pem, lambda: serialization.load_pem_public_key(pem))
+
+    def info(self) -> KeyCacheInfo:
+        return KeyCacheInfo(self.hits, self.misses, self.evictions, len(self._keys), self.maxsize)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+    def _load(self, kind: str, pem: bytes, loader: Callable[[], Any]):
+        fingerprint = (kind, hashlib.sha256(pem).digest())
+        with self._lock:
+            key = self._keys.get(fingerprint)
+            if key is not None:
+                self.hits += 1
+                self._keys.move_to_end(fingerprint)
+                return key
+            self.misses += 1
+        # Parse outside the lock; a concurrent miss on the same key just parses twice
+        with METRICS.stage("signed.pem_load", len(pem)):
+            key = loader()
+        if self.maxsize > 0:
+            with self._lock:
+                self._keys[fingerprint] = key
+                self._keys.move_to_end(fingerprint)
+                while len(self._keys) > self.maxsize:
+                    self._keys.popitem(last=False)
+                    self.evictions += 1
+        return key
+
+PSS_PADDING = padding.PSS(
+    mgf=padding.MGF1(hashes.SHA256()),
+    salt_length=padding.PSS.MAX_LENGTH
+)
+
+# Bodies may be a str, bytes, a file-like object, or an iterable of str/bytes chunks
+MessageBody = Union[str, bytes, Iterable[Union[str, bytes]], Any]
+
+HASH_CHUNK_SIZE = 1 << 20
+
+# One-shot bodies are spooled so the message can be hashed again on receipt;
+# past this many bytes the spool moves from memory to a temporary file
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+# Used by verify_batch workers running in other processes
+_PROCESS_KEY_CACHE = KeyCache()
+
+SIGNATURE_ALGORITHMS = ("rsa-pss", "ecdsa-p256", "ed25519")
 
-    def generate_key_pair(self) -> Tuple[bytes, bytes]:
-        """Generate a new RSA key pair."""
+# Messages signed before algorithms were recorded are RSA-PSS
+DEFAULT_SIGNATURE_ALGORITHM = "rsa-pss"
+
+def _signature_hash(prehashed: bool):
+    """str bodies sign their hash as data (hashed again by the scheme); streamed bodies
+    sign the SHA-256 digest directly through Prehashed, like a standard signature."""
+    return utils.Prehashed(hashes.SHA256()) if prehashed else hashes.SHA256()
+
+def key_algorithm(key) -> str:
+    """Name the signature algorithm a loaded private or public key is used with."""
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return "rsa-pss"
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)) and isinstance(key.curve, ec.SECP256R1):
+        return "ecdsa-p256"
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return "ed25519"
+    raise ValueError(f"Unsupported signing key type {type(key).__name__}.")
+
+def _sign(key, message_hash: bytes, prehashed: bool) -> bytes:
+    algorithm = key_algorithm(key)
+    with METRICS.stage("signed.sign"):
+        if algorithm == "ed25519":
+            # Ed25519 hashes internally and has no prehashed mode; the digest is the signed data
+            return key.sign(message_hash)
+        if algorithm == "ecdsa-p256":
+            return key.sign(message_hash, ec.ECDSA(_signature_hash(prehashed)))
+        return key.sign(message_hash, PSS_PADDING, _signature_hash(prehashed))
+
+def _verify(key, signature: bytes, message_hash: bytes, prehashed: bool, algorithm: str) -> bool:
+    # A signature only counts under the algorithm its metadata claims
+    if key_algorithm(key) != algorithm:
+        return False
+    try:
+        with METRICS.stage("signed.verify"):
+            if algorithm == "ed25519":
+                key.verify(signature, message_hash)
+            elif algorithm == "ecdsa-p256":
+                key.verify(signature, message_hash, ec.ECDSA(_signature_hash(prehashed)))
+            else:
+                key.verify(signature, message_hash, PSS_PADDING, _signature_hash(prehashed))
+        return True
+    except InvalidSignature:
+        return False
+
+def _body_chunks(message_body: MessageBody) -> Iterator[bytes]:
+    if isinstance(message_body, str):
+        for start in range(0, len(message_body), HASH_CHUNK_SIZE):
+            yield message_body[start:start + HASH_CHUNK_SIZE].encode()
+    elif isinstance(message_body, (bytes, bytearray, memoryview)):
+        yield message_body
+    elif hasattr(message_body, "read"):
+        # Rewind seekable files so the body can be hashed again on receipt
+        position = message_body.tell() if _seekable(message_body) else None
+        while True:
+            chunk = message_body.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk.encode() if isinstance(chunk, str) else chunk
+        if position is not None:
+            message_body.seek(position)
+    else:
+        for chunk in message_body:
+            yield chunk.encode() if isinstance(chunk, str) else chunk
+
+def _seekable(file) -> bool:
+    # SpooledTemporaryFile only gained seekable() in Python 3.11
+    seekable = getattr(file, "seekable", None)
+    return seekable() if seekable is not None else hasattr(file, "seek")
+
+def _is_one_shot(message_body: MessageBody) -> bool:
+    """Whether reading the body consumes it: iterators, generators and non-seekable files."""
+    if isinstance(message_body, (str, bytes, bytearray, memoryview)):
+        return False
+    if hasattr(message_body, "read"):
+        return not _seekable(message_body)
+    return iter(message_body) is message_body
+
+def _spool(message_body: MessageBody) -> tempfile.SpooledTemporaryFile:
+    """Copy a one-shot body into a rewound spool file that can be read any number of times."""
+    spool = tempfile.SpooledTemporaryFile(SPOOL_MAX_MEMORY)
+    for chunk in _body_chunks(message_body):
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+def _verify_group(public_key: bytes, items: List[Tuple[bytes, bytes, bool, str]],
+                  key_cache: Optional[KeyCache] = None) -> List[bool]:
+    """Verify (hash, signature, prehashed, algorithm) tuples that share one sender key."""
+    key = (key_cache or _PROCESS_KEY_CACHE).load_public_key(public_key)
+    return [_verify(key, signature, message_hash, prehashed, algorithm)
+            for message_hash, signature, prehashed, algorithm in items]
+
+def _sign_chunk(private_keys: Dict[str, bytes], items: List[Tuple[str, str]],
+                key_cache: Optional[KeyCache] = None) -> List[Tuple[bytes, bytes, str]]:
+    """Hash and sign (sender_id, body) pairs, returning (hash, signature, algorithm) for each."""
+    key_cache = key_cache or _PROCESS_KEY_CACHE
+    results = []
+    for sender_id, message_body in items:
+        with METRICS.stage("signed.hash") as stage:
+            encoded = message_body.encode()
+            stage.add_bytes(len(encoded))
+            digest = hashes.Hash(hashes.SHA256())
+            digest.update(encoded)
+            message_hash = digest.finalize()
+        key = key_cache.load_private_key(private_keys[sender_id])
+        results.append((message_hash, _sign(key, message_hash, False), key_algorithm(key)))
+    return results
+
+def _is_prehashed(message: Message) -> bool:
+    return bool((message.metadata.additional_data or {}).get("prehashed"))
+
+def _signature_algorithm(message: Message) -> str:
+    return (message.metadata.additional_data or {}).get("signature_algorithm", DEFAULT_SIGNATURE_ALGORITHM)
+
+def _signing_metadata(message_hash: bytes, signature: bytes, algorithm: str, prehashed: bool) -> MessageMetadata:
+    additional_data = {"signature_algorithm": algorithm}
+    if prehashed:
+        additional_data["prehashed"] = True
+    return MessageMetadata(
+        message_type=MessageType.SIGNED,
+        signature=signature,
+        original_hash=message_hash,
+        additional_data=additional_data
+    )
+
+def generate_key_pair(algorithm: str = DEFAULT_SIGNATURE_ALGORITHM) -> Tuple[bytes, bytes]:
+    """Generate a new key pair for one of SIGNATURE_ALGORITHMS (RSA-2048 by default).
+
+    The algorithm travels with the key, so a Person signs with whichever
+    kind of key they were given.
+    """
+    if algorithm == "ed25519":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    elif algorithm == "ecdsa-p256":
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    elif algorithm == "rsa-pss":
         private_key = rsa.generate_private_key(
             public_exponent=65537,
             key_size=2048
         )
-        public_key = private_key.public_key()
-    
-        # Properly serialize the keys
-        private_bytes = private_key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()
-        )
-    
-        public_bytes = public_key.public_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PublicFormat.SubjectPublicKeyInfo
-        )
-    
-        return private_bytes, public_bytes
+    else:
+        raise ValueError(f"Unknown signature algorithm {algorithm!r}; expected one of {SIGNATURE_ALGORITHMS}.")
+    public_key = private_key.public_key()
+
+    # Properly serialize the keys
+    private_bytes = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+
+    public_bytes = public_key.public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+    return private_bytes, public_bytes
+
+class SignedMessenger:
+    def __init__(self, network: CommunicationNetwork, key_cache_size: int = 1024):
+        self.network = network
+        self.key_cache = KeyCache(key_cache_size)
 
-    def calculate_message_hash(self, message_body: str) -> bytes:
-        """Calculate the SHA-256 hash of a message."""
-        digest = hashes.Hash(hashes.SHA256())
-        digest.update(message_body.encode())
-        return digest.finalize()
+    def generate_key_pair(self, algorithm: str = DEFAULT_SIGNATURE_ALGORITHM) -> Tuple[bytes, bytes]:
+        """Generate a new key pair for one of SIGNATURE_ALGORITHMS (RSA-2048 by default)."""
+        return generate_key_pair(algorithm)
 
-    def encrypt_hash(self, message_hash: bytes, private_key: bytes) -> bytes:
+    def calculate_message_hash(self, message_body: MessageBody) -> bytes:
+        """Calculate the SHA-256 hash of a message, reading it in chunks."""
+        with METRICS.stage("signed.hash") as stage:
+            digest = hashes.Hash(hashes.SHA256())
+            for chunk in _body_chunks(message_body):
+                digest.update(chunk)
+                stage.add_bytes(len(chunk))
+            return digest.finalize()
+
+    def encrypt_hash(self, message_hash: bytes, private_key: bytes, prehashed: bool = False) -> bytes:
         """Encrypt (sign) the message hash using the sender's private key."""
-        key = serialization.load_pem_private_key(private_key, password=None)
-        signature = key.sign(
-            message_hash,
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH
-            ),
-            hashes.SHA256()
-        )
+        key = self.key_cache.load_private_key(private_key)
+        signature = _sign(key, message_hash, prehashed)
         return signature
 
-    def verify_signature(self, message_hash: bytes, signature: bytes, public_key: bytes) -> bool:
+    def verify_signature(self, message_hash: bytes, signature: bytes, public_key: bytes,
+                         prehashed: bool = False, algorithm: str = DEFAULT_SIGNATURE_ALGORITHM) -> bool:
         """Verify the signature using the sender's public key."""
-        try:
-            key = serialization.load_pem_public_key(public_key)
-            key.verify(
-                signature,
-                message_hash,
-                padding.PSS(
-                    mgf=padding.MGF1(hashes.SHA256()),
-                    salt_length=padding.PSS.MAX_LENGTH
-                ),
-                hashes.SHA256()
-            )
-            return True
-        except InvalidSignature:
-            return False
+        key = self.key_cache.load_public_key(public_key)
+        return _verify(key, signature, message_hash, prehashed, algorithm)
 
-    def send_signed_message(self, sender_id: str, receiver_id: str, message_body: str) -> Optional[Message]:
+    def send_signed_message(self, sender_id: str, receiver_id: str, message_body: MessageBody) -> Optional[Message]:
         """Send a signed message from one person to another."""
         sender = self.network.get_person(sender_id)
         receiver = self.network.get_person(receiver_id)
@@ -85,16 +285,20 @@ class SignedMessenger:
         if not (sender and receiver and sender.private_key):
             return None
 
-        # Calculate message hash and create signature
+        # Hashing would consume a generator or pipe and leave the message with an
+        # empty body, so those are spooled first and the spool becomes the body
+        if _is_one_shot(message_body):
+            message_body = _spool(message_body)
+
+        # Calculate message hash and create signature; non-str bodies are
+        # streamed, and their digest is signed directly (Prehashed)
+        prehashed = not isinstance(message_body, str)
         message_hash = self.calculate_message_hash(message_body)
-        signature = self.encrypt_hash(message_hash, sender.private_key)
+        key = self.key_cache.load_private_key(sender.private_key)
+        signature = _sign(key, message_hash, prehashed)
 
         # Create metadata for signed message
-        metadata = MessageMetadata(
-            message_type=MessageType.SIGNED,
-            signature=signature,
-            original_hash=message_hash
-        )
+        metadata = _signing_metadata(message_hash, signature, key_algorithm(key), prehashed)
 
         # Create and return the signed message
         return Message(
@@ -120,9 +324,142 @@ class SignedMessenger:
         return self.verify_signature(
             message.metadata.original_hash,
             message.metadata.signature,
-            message.sender.public_key
+            message.sender.public_key,
+            _is_prehashed(message),
+            _signature_algorithm(message)
         )
 
+    def broadcast(self, sender_id: str, message_body: MessageBody,
+                  receivers: Optional[Iterable[str]] = None) -> Optional[BroadcastResult]:
+        """Sign one body once and address it to many receivers (everyone reachable by default).
+
+        One BFS tree from the sender decides who is reachable; it is returned
+        so callers can forward along it. Every message shares the same body
+        object and the same metadata, so treat them as read-only.
+        """
+        sender = self.network.get_person(sender_id)
+        if not (sender and sender.private_key):
+            return None
+
+        # Streams can only be read once, so buffer them before sharing
+        if not isinstance(message_body, (str, bytes, bytearray, memoryview)):
+            message_body = b"".join(_body_chunks(message_body))
+        prehashed = not isinstance(message_body, str)
+        message_hash = self.calculate_message_hash(message_body)
+        key = self.key_cache.load_private_key(sender.private_key)
+        metadata = _signing_metadata(message_hash, _sign(key, message_hash, prehashed), key_algorithm(key), prehashed)
+
+        tree = self.network.spanning_tree(sender_id)
+        _, dist = tree
+        people = self.network.people
+        if receivers is None:
+            receivers = (person_id for person_id in dist if person_id != sender_id)
+        messages, unreachable = [], []
+        for receiver_id in receivers:
+            receiver = people.get(receiver_id)
+            if receiver is None or receiver_id not in dist:
+                unreachable.append(receiver_id)
+            else:
+                messages.append(Message(sender, receiver, metadata, message_body))
+        return BroadcastResult(messages, unreachable, tree)
+
+    async def send_signed_message_async(self, sender_id: str, receiver_id: str, message_body: MessageBody,
+                                        executor: Optional[Executor] = None) -> Optional[Message]:
+        """send_signed_message with hashing and signing run in a thread executor (the loop's default if None)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.send_signed_message, sender_id, receiver_id, message_body)
+
+    async def verify_received_message_async(self, message: Message, executor: Optional[Executor] = None) -> bool:
+        """verify_received_message run in a thread executor (the loop's default if None)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.verify_received_message, message)
+
+    def send_signed_batch(self, items: Iterable[Tuple[str, str, str]], workers: Optional[int] = None,
+                          use_processes: bool = True, chunk_size: int = 32,
+                          max_in_flight: Optional[int] = None) -> Iterator[Message]:
+        """Sign a stream of (sender_id, receiver_id, body) tuples on a worker pool.
+
+        Messages are yielded as their chunk completes, so the order is not the
+        input order. At most max_in_flight chunks (default 4 per worker) are
+        queued; the input is only read further once a chunk finishes, so a slow
+        consumer throttles the whole pipeline. Workers keep the parsed sender
+        keys in their own key cache. Tuples that send_signed_message would
+        reject (unknown people, no private key) are skipped.
+        """
+        workers = workers or os.cpu_count() or 1
+        limit = max_in_flight or 4 * workers
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        key_cache = None if use_processes else self.key_cache
+
+        with executor_class(max_workers=workers) as executor:
+            in_flight = {}
+            for people, private_keys, chunk in self._signing_chunks(items, chunk_size):
+                if len(in_flight) >= limit:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from self._signed_messages(in_flight.pop(future), future.result())
+                future = executor.submit(_sign_chunk, private_keys, chunk, key_cache)
+                in_flight[future] = (people, chunk)
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from self._signed_messages(in_flight.pop(future), future.result())
+
+    def _signing_chunks(self, items: Iterable[Tuple[str, str, str]], chunk_size: int):
+        people, private_keys, chunk = [], {}, []
+        for sender_id, receiver_id, message_body in items:
+            sender = self.network.get_person(sender_id)
+            receiver = self.network.get_person(receiver_id)
+            if not (sender and receiver and sender.private_key):
+                continue
+            people.append((sender, receiver))
+            private_keys[sender_id] = sender.private_key
+            chunk.append((sender_id, message_body))
+            if len(chunk) == chunk_size:
+                yield people, private_keys, chunk
+                people, private_keys, chunk = [], {}, []
+        if chunk:
+            yield people, private_keys, chunk
+
+    def _signed_messages(self, submitted, signatures: List[Tuple[bytes, bytes, str]]) -> Iterator[Message]:
+        people, chunk = submitted
+        for (sender, receiver), (_, message_body), (message_hash, signature, algorithm) in zip(people, chunk, signatures):
+            metadata = _signing_metadata(message_hash, signature, algorithm, False)
+            yield Message(sender=sender, receiver=receiver, metadata=metadata, body=message_body)
+
+    def verify_batch(self, messages: Sequence[Message], workers: Optional[int] = None,
+                     use_processes: bool = False, chunk_size: int = 64) -> List[bool]:
+        """Verify many signed messages in parallel; results are in input order.
+
+        Messages are grouped by sender key so each key is parsed once per worker,
+        and the RSA-PSS checks run on a thread pool (the cryptography backend
+        releases the GIL) or, with use_processes=True, a process pool.
+        """
+        results = [False] * len(messages)
+        groups: Dict[bytes, List[int]] = {}
+        for index, message in enumerate(messages):
+            if message.metadata.message_type != MessageType.SIGNED or not message.sender.public_key:
+                continue
+            # Tampered bodies fail here without spending an RSA operation
+            if self.calculate_message_hash(message.body) != message.metadata.original_hash:
+                continue
+            groups.setdefault(message.sender.public_key, []).append(index)
+
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        key_cache = None if use_processes else self.key_cache
+        with executor_class(max_workers=workers) as executor:
+            submitted = []
+            for public_key, indices in groups.items():
+                for start in range(0, len(indices), chunk_size):
+                    chunk = indices[start:start + chunk_size]
+                    items = [(messages[i].metadata.original_hash, messages[i].metadata.signature,
+                              _is_prehashed(messages[i]), _signature_algorithm(messages[i])) for i in chunk]
+                    submitted.append((chunk, executor.submit(_verify_group, public_key, items, key_cache)))
+            for chunk, future in submitted:
+                for index, is_valid in zip(chunk, future.result()):
+                    results[index] = is_valid
+        return results
+
 if __name__ == "__main__":
     # Example usage
     network = CommunicationNetwork()
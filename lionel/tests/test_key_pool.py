@@ -0,0 +1,52 @@
+import pytest
+from structures import Person, CommunicationNetwork
+from signed_messages import SignedMessenger
+from key_pool import KeyPool
+
+@pytest.fixture
+def pool():
+    with KeyPool(algorithm="ed25519", depth=4, low_watermark=2, workers=2) as key_pool:
+        assert key_pool.wait_until_full(timeout=30)
+        yield key_pool
+
+def test_pool_fills_to_depth(pool):
+    metrics = pool.metrics()
+    assert metrics.available == 4
+    assert metrics.generated_background == 4
+    assert metrics.refills == 1
+
+def test_pool_hands_out_distinct_keys(pool):
+    key_pairs = [pool.get() for _ in range(3)]
+    assert len({private_key for private_key, _ in key_pairs}) == 3
+    metrics = pool.metrics()
+    assert metrics.served == 3
+    assert metrics.served_from_pool == 3
+    # Dropping below the watermark schedules a refill back to depth
+    assert metrics.refills == 2
+    assert pool.wait_until_full(timeout=30)
+
+def test_pool_generates_inline_when_empty():
+    with KeyPool(algorithm="ed25519", depth=1, low_watermark=0, use_processes=False) as key_pool:
+        assert key_pool.wait_until_full(timeout=30)
+        key_pool.get()
+        key_pool.get()
+        assert key_pool.metrics().generated_inline >= 1
+
+def test_network_draws_keys_from_pool(pool):
+    network = CommunicationNetwork(key_pool=pool)
+    messenger = SignedMessenger(network)
+    network.add_person(Person("alice"))
+    network.add_people_bulk([Person("bob"), Person("carol", public_key=b"existing")])
+    network.add_connection("alice", "bob")
+
+    assert network.get_person("alice").private_key is not None
+    assert network.get_person("carol").private_key is None
+    signed_message = messenger.send_signed_message("alice", "bob", "Welcome aboard")
+    assert messenger.verify_received_message(signed_message)
+    assert pool.metrics().served == 2
+
+def test_invalid_pool_settings():
+    with pytest.raises(ValueError):
+        KeyPool(algorithm="dsa")
+    with pytest.raises(ValueError):
+        KeyPool(depth=0)
@@ -1,5 +1,6 @@
+import asyncio
 import pytest
-from structures import Person, CommunicationNetwork
+from structures import Person, CommunicationNetwork, METRICS
 from signed_messages import SignedMessenger
 
 @pytest.fixture
@@ -67,4 +68,186 @@ def test_wrong_sender(messenger, setup_network):
     
     signed_message = messenger.send_signed_message("alice", "bob", message)
     signed_message.sender = eve
-    assert not messenger.verify_received_message(signed_message)
\ No newline at end of file
+    assert not messenger.verify_received_message(signed_message)
+
+def test_key_cache_reuses_parsed_keys(messenger, setup_network):
+    network, alice, bob = setup_network
+    for _ in range(3):
+        signed_message = messenger.send_signed_message("alice", "bob", "Hello again")
+        assert messenger.verify_received_message(signed_message)
+
+    info = messenger.key_cache.info()
+    # One private and one public key parsed; every later call is a hit
+    assert info.misses == 2
+    assert info.hits == 4
+    assert info.currsize == 2
+
+def test_key_cache_eviction(network, setup_network):
+    _, alice, bob = setup_network
+    small_messenger = SignedMessenger(network, key_cache_size=1)
+    small_messenger.key_cache.load_public_key(alice.public_key)
+    small_messenger.key_cache.load_public_key(bob.public_key)
+    small_messenger.key_cache.load_public_key(alice.public_key)
+
+    info = small_messenger.key_cache.info()
+    assert info.misses == 3
+    assert info.evictions == 2
+    assert info.currsize == 1
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_verify_batch(messenger, setup_network, use_processes):
+    network, alice, bob = setup_network
+    messages = [
+        messenger.send_signed_message("alice", "bob", f"Message {i}")
+        for i in range(10)
+    ]
+    messages.append(messenger.send_signed_message("bob", "alice", "Reply"))
+    messages[3].body = "Tampered message"
+    messages[5].metadata.signature = messages[6].metadata.signature
+    messages[6].metadata.original_hash = messenger.calculate_message_hash(messages[6].body)
+
+    expected = [messenger.verify_received_message(message) for message in messages]
+    assert expected.count(False) == 2
+    assert messenger.verify_batch(messages, workers=2, use_processes=use_processes, chunk_size=3) == expected
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_send_signed_batch(messenger, setup_network, use_processes):
+    network, alice, bob = setup_network
+    items = [("alice", "bob", f"Notification {i}") for i in range(20)]
+    items.append(("bob", "alice", "Reply"))
+    items.append(("alice", "mallory", "Dropped"))
+
+    messages = list(messenger.send_signed_batch(
+        iter(items), workers=2, use_processes=use_processes, chunk_size=3, max_in_flight=2
+    ))
+
+    assert sorted(message.body for message in messages) == sorted(body for _, _, body in items[:-1])
+    assert all(messenger.verify_received_message(message) for message in messages)
+    reply = next(message for message in messages if message.body == "Reply")
+    assert reply.sender == bob and reply.receiver == alice
+
+def test_streamed_body_signing(messenger, setup_network, tmp_path):
+    import io
+    network, alice, bob = setup_network
+    payload = b"attachment-bytes " * 200000
+    attachment = tmp_path / "attachment.bin"
+    attachment.write_bytes(payload)
+
+    with open(attachment, "rb") as handle:
+        signed_message = messenger.send_signed_message("alice", "bob", handle)
+        assert signed_message.metadata.additional_data["prehashed"]
+        # Seekable bodies are rewound, so the same handle verifies
+        assert messenger.verify_received_message(signed_message)
+
+    assert signed_message.metadata.original_hash == messenger.calculate_message_hash(payload)
+    signed_message.body = [payload[:1000], payload[1000:]]
+    assert messenger.verify_received_message(signed_message)
+    assert messenger.verify_batch([signed_message]) == [True]
+
+    signed_message.body = io.BytesIO(payload[:-1] + b"!")
+    assert not messenger.verify_received_message(signed_message)
+
+def test_one_shot_bodies_still_verify(messenger, setup_network):
+    import os
+    network, alice, bob = setup_network
+    payload = b"streamed " * 50000
+
+    generated = messenger.send_signed_message("alice", "bob", (payload[start:start + 4096]
+                                                                 for start in range(0, len(payload), 4096)))
+    assert messenger.verify_received_message(generated)
+    assert messenger.verify_received_message(generated)
+
+    read_end, write_end = os.pipe()
+    with os.fdopen(write_end, "wb") as writer:
+        writer.write(payload[:60000])
+    with os.fdopen(read_end, "rb") as reader:
+        piped = messenger.send_signed_message("alice", "bob", reader)
+    assert messenger.verify_received_message(piped)
+    assert piped.metadata.original_hash == messenger.calculate_message_hash(payload[:60000])
+
+    # Re-iterable bodies are kept as given
+    chunks = [payload[:10], payload[10:]]
+    assert messenger.send_signed_message("alice", "bob", chunks).body is chunks
+
+def test_chunked_str_hash_matches(messenger):
+    body = "héllo " * 400000
+    assert messenger.calculate_message_hash(body) == messenger.calculate_message_hash([body[:7], body[7:]])
+    assert messenger.calculate_message_hash(body) == messenger.calculate_message_hash(body.encode())
+
+@pytest.mark.parametrize("algorithm", ["rsa-pss", "ecdsa-p256", "ed25519"])
+def test_signature_algorithms(network, messenger, algorithm):
+    import io
+    carol = Person("carol")
+    carol.private_key, carol.public_key = messenger.generate_key_pair(algorithm)
+    network.add_person(carol)
+    network.add_person(Person("dave"))
+
+    signed_message = messenger.send_signed_message("carol", "dave", "Hello, Dave!")
+    assert signed_message.metadata.additional_data["signature_algorithm"] == algorithm
+    assert messenger.verify_received_message(signed_message)
+
+    streamed_message = messenger.send_signed_message("carol", "dave", io.BytesIO(b"stream" * 1000))
+    assert messenger.verify_received_message(streamed_message)
+    assert messenger.verify_batch([signed_message, streamed_message]) == [True, True]
+
+    batch = list(messenger.send_signed_batch([("carol", "dave", "Batched")], use_processes=False))
+    assert messenger.verify_received_message(batch[0])
+
+    signed_message.body = "Tampered message"
+    assert not messenger.verify_received_message(signed_message)
+
+def test_algorithm_mismatch_rejected(network, messenger, setup_network):
+    _, alice, bob = setup_network
+    signed_message = messenger.send_signed_message("alice", "bob", "Hello")
+    signed_message.metadata.additional_data["signature_algorithm"] = "ed25519"
+    assert not messenger.verify_received_message(signed_message)
+
+    with pytest.raises(ValueError):
+        messenger.generate_key_pair("dsa")
+
+def test_async_send_and_verify(messenger, setup_network):
+    async def send_and_verify():
+        messages = await asyncio.gather(*(messenger.send_signed_message_async("alice", "bob", f"Message {i}")
+                                          for i in range(4)))
+        return await asyncio.gather(*(messenger.verify_received_message_async(message) for message in messages))
+    assert asyncio.run(send_and_verify()) == [True] * 4
+
+def test_broadcast_signs_once(network, messenger, setup_network):
+    _, alice, bob = setup_network
+    for person_id in ["carol", "dave", "eve"]:
+        network.add_person(Person(person_id))
+    network.add_connection("bob", "carol")
+    network.add_connection("carol", "dave")
+    messenger.key_cache.clear()
+
+    result = messenger.broadcast("alice", "Announcement")
+    assert sorted(message.receiver.id for message in result.messages) == ["bob", "carol", "dave"]
+    assert messenger.key_cache.info().misses == 1
+    assert len({id(message.body) for message in result.messages}) == 1
+    assert all(messenger.verify_received_message(message) for message in result.messages)
+    pred, dist = result.tree
+    assert dist["dave"] == 3 and pred["dave"] == "carol"
+
+    result = messenger.broadcast("alice", iter([b"streamed ", b"body"]), receivers=["dave", "eve", "nobody"])
+    assert [message.body for message in result.messages] == [b"streamed body"]
+    assert result.unreachable == ["eve", "nobody"]
+    assert messenger.verify_received_message(result.messages[0])
+    assert messenger.broadcast("eve", "No key") is None
+
+def test_signing_stages_are_instrumented(messenger, setup_network):
+    METRICS.reset()
+    METRICS.enable()
+    try:
+        messenger.key_cache.clear()
+        message = messenger.send_signed_message("alice", "bob", "Hello")
+        messenger.verify_received_message(message)
+        snapshot = METRICS.snapshot()
+    finally:
+        METRICS.disable()
+        METRICS.reset()
+    assert snapshot["signed.hash"].count == 2
+    assert snapshot["signed.hash"].bytes == 10
+    assert snapshot["signed.pem_load"].count == 2
+    assert snapshot["signed.sign"].count == 1
+    assert snapshot["signed.verify"].count == 1
+
@@ -1,9 +1,23 @@
+import tracemalloc
+
+import networkx as nx
 import pytest
-from structures import Person, CommunicationNetwork, MessageType, MessageMetadata, Message
+from structures import (
+    Person,
+    CommunicationNetwork,
+    MessageType,
+    MessageMetadata,
+    Message,
+    CompactPerson,
+    CompactMessage,
+    MessageBatch,
+    Metrics,
+    METRICS
+)
 
-@pytest.fixture
-def network():
-    return CommunicationNetwork()
+@pytest.fixture(params=["networkx", "csr"])
+def network(request):
+    return CommunicationNetwork(backend=request.param)
 
 def test_add_person(network):
     alice = Person("alice")
@@ -42,4 +56,311 @@ def test_message_creation():
     assert message.sender == alice
     assert message.receiver == bob
     assert message.metadata.message_type == MessageType.SIGNED
-    assert message.body == "Hello"
\ No newline at end of file
+    assert message.body == "Hello"
+
+def test_path_cache_hits(network):
+    for person_id in ["alice", "bob", "charlie"]:
+        network.add_person(Person(person_id))
+    network.add_connection("alice", "bob")
+    network.add_connection("bob", "charlie")
+
+    # The first miss is a one-off search; the source's second miss caches its tree
+    assert network.get_path("alice", "charlie") == ["alice", "bob", "charlie"]
+    assert network.route_cache_info().currsize == 0
+    assert network.get_path("alice", "charlie") == ["alice", "bob", "charlie"]
+    assert network.get_path("alice", "bob") == ["alice", "bob"]
+
+    info = network.route_cache_info()
+    assert info.misses == 2
+    assert info.hits == 1
+    assert (info.currsize, info.nodes) == (1, 3)
+
+def test_path_cache_invalidation(network):
+    for person_id in ["alice", "bob", "charlie", "dave"]:
+        network.add_person(Person(person_id))
+    network.add_connection("alice", "bob")
+    network.add_connection("bob", "charlie")
+    network.add_connection("charlie", "dave")
+    network.get_path("alice", "dave")
+    assert network.get_path("alice", "dave") == ["alice", "bob", "charlie", "dave"]
+
+    # Shortcut edge must invalidate the cached tree
+    network.add_connection("alice", "charlie")
+    assert network.get_path("alice", "dave") == ["alice", "charlie", "dave"]
+
+    # Removing a tree edge disconnects dave
+    network.remove_connection("charlie", "dave")
+    assert network.get_path("alice", "dave") == []
+
+    network.remove_person("charlie")
+    assert network.get_path("alice", "bob") == ["alice", "bob"]
+    assert network.get_person("charlie") is None
+    assert network.route_cache_info().invalidations == 3
+
+def test_path_cache_keeps_unaffected_routes(network):
+    for person_id in ["alice", "bob", "charlie", "dave"]:
+        network.add_person(Person(person_id))
+    network.add_connection("alice", "bob")
+    network.get_path("alice", "bob")
+    network.get_path("alice", "bob")
+
+    # Edge in a component the cached tree never reached
+    network.add_connection("charlie", "dave")
+    assert network.get_path("alice", "bob") == ["alice", "bob"]
+    assert network.route_cache_info().invalidations == 0
+
+def test_path_cache_eviction():
+    network = CommunicationNetwork(route_cache_size=1)
+    for person_id in ["alice", "bob"]:
+        network.add_person(Person(person_id))
+    network.add_connection("alice", "bob")
+    for source, target in [("alice", "bob"), ("alice", "bob"), ("bob", "alice"), ("bob", "alice"), ("alice", "bob")]:
+        network.get_path(source, target)
+
+    info = network.route_cache_info()
+    assert info.misses == 5
+    assert info.currsize == 1
+
+def test_path_cache_node_budget(network):
+    network.route_cache_nodes = 2
+    for person_id in ["alice", "bob", "charlie"]:
+        network.add_person(Person(person_id))
+    network.add_connection("alice", "bob")
+    network.add_connection("bob", "charlie")
+
+    # A tree bigger than the whole budget is never kept
+    for _ in range(3):
+        assert network.get_path("alice", "charlie") == ["alice", "bob", "charlie"]
+    info = network.route_cache_info()
+    assert (info.misses, info.currsize, info.nodes) == (3, 0, 0)
+
+def test_connectivity_index(network):
+    for person_id in ["alice", "bob", "charlie", "dave"]:
+        network.add_person(Person(person_id))
+    network.add_connection("alice", "bob")
+    network.add_connection("charlie", "dave")
+
+    assert network.are_connected("alice", "bob")
+    assert not network.are_connected("alice", "charlie")
+    assert sorted(map(sorted, network.connected_components())) == [["alice", "bob"], ["charlie", "dave"]]
+
+    network.add_connection("bob", "charlie")
+    assert network.are_connected("alice", "dave")
+
+def test_connectivity_after_removal(network):
+    for person_id in ["alice", "bob", "charlie"]:
+        network.add_person(Person(person_id))
+    network.add_connection("alice", "bob")
+    network.add_connection("bob", "charlie")
+
+    network.remove_connection("bob", "charlie")
+    assert not network.are_connected("alice", "charlie")
+    assert len(network.connected_components()) == 2
+
+    network.add_connection("alice", "charlie")
+    assert network.are_connected("bob", "charlie")
+    network.remove_person("alice")
+    assert not network.are_connected("bob", "charlie")
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        CommunicationNetwork(backend="adjacency-matrix")
+
+def test_one_off_paths_are_shortest():
+    import random
+    rng = random.Random(312)
+    graph = nx.gnm_random_graph(80, 100, seed=312)
+    # With the cache disabled every lookup is a bidirectional search
+    for backend in ["networkx", "csr"]:
+        network = CommunicationNetwork(route_cache_size=0, backend=backend)
+        network.add_people_bulk(Person(f"p{node}") for node in graph)
+        network.add_connections_bulk((f"p{u}", f"p{v}") for u, v in graph.edges)
+        for _ in range(200):
+            source, target = rng.randrange(80), rng.randrange(80)
+            path = network.get_path(f"p{source}", f"p{target}")
+            if nx.has_path(graph, source, target):
+                assert len(path) == nx.shortest_path_length(graph, source, target) + 1
+                assert (path[0], path[-1]) == (f"p{source}", f"p{target}")
+                assert all(network.graph.has_edge(a, b) for a, b in zip(path, path[1:]))
+            else:
+                assert path == []
+        assert network.route_cache_info().currsize == 0
+
+def test_csr_backend_matches_networkx():
+    import random
+    rng = random.Random(311)
+    ids = [f"p{i}" for i in range(60)]
+    edges = [(rng.choice(ids), rng.choice(ids)) for _ in range(90)]
+
+    reference = CommunicationNetwork()
+    compact = CommunicationNetwork(backend="csr")
+    for net in (reference, compact):
+        for person_id in ids:
+            net.add_person(Person(person_id))
+        for person1_id, person2_id in edges:
+            net.add_connection(person1_id, person2_id)
+        net.remove_connection(*edges[0])
+        net.remove_person("p7")
+
+    assert compact.graph.number_of_edges() == reference.graph.number_of_edges()
+    assert sorted(map(sorted, compact.graph.edges)) == sorted(map(sorted, reference.graph.edges))
+    for source in ids[:10]:
+        for target in ids:
+            if source == "p7" or target == "p7":
+                continue
+            path = compact.get_path(source, target)
+            assert len(path) == len(reference.get_path(source, target))
+            assert all(compact.graph.has_edge(a, b) for a, b in zip(path, path[1:]))
+            assert compact.are_connected(source, target) == reference.are_connected(source, target)
+
+def test_bulk_loading(network):
+    network.add_people_bulk(Person(person_id) for person_id in ["alice", "bob", "charlie", "dave"])
+    invalid = network.add_connections_bulk(
+        [("alice", "bob"), ("bob", "charlie"), ("charlie", "mallory"), ("eve", "dave")],
+        batch_size=2
+    )
+
+    assert invalid == [("charlie", "mallory"), ("eve", "dave")]
+    assert network.get_path("alice", "charlie") == ["alice", "bob", "charlie"]
+    assert not network.are_connected("alice", "dave")
+
+def test_bulk_loading_rebuilds_csr_once(monkeypatch):
+    from structures import CSRGraph
+    network = CommunicationNetwork(backend="csr")
+    network.add_people_bulk(Person(f"p{index}") for index in range(200))
+    rebuilds = []
+    set_edges = CSRGraph._set_edges
+    monkeypatch.setattr(CSRGraph, "_set_edges", lambda graph, *args: rebuilds.append(1) or set_edges(graph, *args))
+
+    # Ten batches must not mean ten merges of everything loaded so far
+    network.add_connections_bulk([(f"p{index}", f"p{index + 1}") for index in range(199)], batch_size=20)
+    assert network.graph.number_of_edges() == 199
+    assert len(rebuilds) == 1
+
+def test_bulk_loading_strict(network):
+    network.add_people_bulk([Person("alice"), Person("bob")])
+    with pytest.raises(ValueError):
+        network.add_connections_bulk([("alice", "bob"), ("alice", "mallory")], strict=True)
+    assert not network.are_connected("alice", "bob")
+
+def test_bulk_loading_from_arrays_and_csv(network, tmp_path):
+    import numpy as np
+    network.add_people_bulk(Person(person_id) for person_id in ["alice", "bob", "charlie", "dave"])
+    invalid = network.add_connections_bulk(np.array([["alice", "bob"], ["bob", "zed"]]))
+    assert invalid == [("bob", "zed")]
+
+    csv_path = tmp_path / "edges.csv"
+    csv_path.write_text("source,target\nbob,charlie\ncharlie,dave\ndave\n")
+    invalid = network.add_connections_from_csv(str(csv_path), has_header=True)
+    assert invalid == [("dave", "")]
+    assert network.get_path("alice", "dave") == ["alice", "bob", "charlie", "dave"]
+    assert network.graph.number_of_edges() == 3
+
+def test_compact_message_round_trip(network):
+    alice = Person("alice", public_key=b"alice-public", private_key=b"alice-private")
+    bob = Person("bob")
+    network.add_person(alice)
+    network.add_person(bob)
+    message = Message(sender=alice, receiver=bob, metadata=MessageMetadata(MessageType.SIGNED, signature=b"sig"), body="Hello")
+
+    compact = CompactMessage.from_message(message)
+    assert compact.sender_id == "alice"
+    assert not hasattr(compact, "__dict__")
+    with pytest.raises(AttributeError):
+        compact.body = "Tampered"
+    assert compact.to_message(network) == message
+    assert CompactPerson.from_person(alice) == CompactPerson("alice", b"alice-public")
+
+def test_message_batch_views(network):
+    alice = Person("alice")
+    bob = Person("bob")
+    network.add_person(alice)
+    network.add_person(bob)
+    messages = [
+        Message(alice, bob, MessageMetadata(MessageType.PLAIN), "Hello"),
+        Message(bob, alice, MessageMetadata(MessageType.RLE_COMPRESSED, original_length=5), "5A"),
+        Message(alice, bob, MessageMetadata(MessageType.ENCRYPTED, additional_data={"nonce": b"n"}), b"\x00\xff"),
+        Message(alice, alice, MessageMetadata(MessageType.PLAIN), "héllo"),
+    ]
+    batch = MessageBatch.from_messages(messages)
+
+    assert len(batch) == 4
+    assert batch.person_ids == ["alice", "bob"]
+    assert batch[1].sender_id == "bob"
+    assert batch[1].message_type == MessageType.RLE_COMPRESSED
+    assert batch[1].metadata.original_length == 5
+    assert batch[2].metadata.additional_data == {"nonce": b"n"}
+    assert batch[-1].text() == "héllo"
+
+    body = batch[2].body
+    assert isinstance(body, memoryview) and body.obj is batch.buffer
+    assert bytes(body) == b"\x00\xff"
+    assert [view.to_message(network) for view in batch] == messages
+
+def test_spanning_tree(network):
+    for person_id in ["a", "b", "c"]:
+        network.add_person(Person(person_id))
+    network.add_connection("a", "b")
+    network.add_connection("b", "c")
+    pred, dist = network.spanning_tree("a")
+    assert (dist["c"], pred["c"], pred["a"]) == (2, "b", None)
+    with pytest.raises(nx.NodeNotFound):
+        network.spanning_tree("z")
+
+@pytest.fixture
+def metrics():
+    METRICS.reset()
+    METRICS.enable()
+    yield METRICS
+    METRICS.disable()
+    METRICS.reset()
+
+def test_metrics_disabled_by_default():
+    metrics = Metrics()
+    with metrics.stage("idle", 10) as stage:
+        stage.add_bytes(5)
+    assert metrics.snapshot() == {}
+
+def test_metrics_record_network_queries(network, metrics):
+    for person_id in ["a", "b", "c"]:
+        network.add_person(Person(person_id))
+    network.add_connection("a", "b")
+    network.add_connection("b", "c")
+    network.get_path("a", "c")
+    network.get_path("a", "b")
+    network.are_connected("a", "c")
+
+    snapshot = metrics.snapshot()
+    assert snapshot["network.get_path"].count == 2
+    assert snapshot["network.bfs"].count == 1
+    assert snapshot["network.add_connection"].count == 2
+    assert snapshot["network.are_connected"].count == 1
+    assert snapshot["network.get_path"].buckets[-1] == (float("inf"), 2)
+
+def test_metrics_bytes_memory_and_export(tmp_path):
+    was_tracing = tracemalloc.is_tracing()
+    metrics = Metrics()
+    metrics.enable(trace_memory=True)
+    try:
+        with metrics.stage("outer", 100) as outer:
+            with metrics.stage("inner"):
+                buffer = bytearray(1 << 20)
+            del buffer
+            outer.add_bytes(50)
+
+        snapshot = metrics.snapshot()
+        assert snapshot["outer"].bytes == 150
+        assert snapshot["inner"].peak_memory >= 1 << 20
+        assert snapshot["outer"].peak_memory >= 1 << 20
+
+        path = tmp_path / "metrics.prom"
+        metrics.write_prometheus(str(path))
+        text = path.read_text()
+        assert "# TYPE messaging_stage_seconds histogram" in text
+        assert 'messaging_stage_seconds_count{stage="inner"} 1' in text
+        assert 'messaging_stage_bytes_total{stage="outer"} 150' in text
+    finally:
+        metrics.disable()
+    # Tracing Metrics started is stopped again; tracing it found running is left alone
+    assert tracemalloc.is_tracing() == was_tracing
+
@@ -1,5 +1,10 @@
+import asyncio
+import os
+import struct
+from concurrent.futures import Executor
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.exceptions import InvalidSignature
 from typing import Tuple, Optional
 
@@ -8,7 +13,8 @@ from structures import (
     MessageType,
     Person,
     MessageMetadata,
-    CommunicationNetwork
+    CommunicationNetwork,
+    METRICS
 )
 
 def generate_rsa_keys(key_size=2048):
@@ -17,6 +23,58 @@ def generate_rsa_keys(key_size=2048):
      public_key = private_key.public_key()
      return private_key, public_key
 
+ENCRYPTION_MODES = ("rsa", "hybrid")
+
+OAEP_PADDING = padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
+
+def load_public_key(key):
+    """Accepts a public key object or PEM bytes (as stored on Person by other messengers)."""
+    if not isinstance(key, bytes):
+        return key
+    with METRICS.stage("encrypted.pem_load", len(key)):
+        return serialization.load_pem_public_key(key)
+
+def load_private_key(key):
+    """Accepts a private key object or unencrypted PEM bytes."""
+    if not isinstance(key, bytes):
+        return key
+    with METRICS.stage("encrypted.pem_load", len(key)):
+        return serialization.load_pem_private_key(key, password=None)
+
+def envelope_associated_data(sender: Person, receiver: Person) -> bytes:
+    """Binds a hybrid ciphertext to its sender and receiver so it cannot be replayed between others.
+
+    Each UTF-8 ID is length-prefixed, so no choice of IDs can make two different pairs collide.
+    """
+    encoded = []
+    for person_id in (sender.id, receiver.id):
+        data = person_id.encode("utf-8")
+        encoded.append(struct.pack("<I", len(data)) + data)
+    return b"".join(encoded)
+
+def hybrid_encrypt(plaintext: bytes, sender: Person, receiver: Person) -> Tuple[bytes, dict]:
+    """AES-256-GCM encrypts plaintext for the receiver; returns the ciphertext and the envelope fields."""
+    public_key = load_public_key(receiver.public_key)
+    data_key = AESGCM.generate_key(bit_length=256)
+    nonce = os.urandom(12)
+    with METRICS.stage("encrypted.aes_encrypt", len(plaintext)):
+        ciphertext = AESGCM(data_key).encrypt(nonce, plaintext, envelope_associated_data(sender, receiver))
+    with METRICS.stage("encrypted.rsa_encrypt", len(data_key)):
+        wrapped_key = public_key.encrypt(data_key, OAEP_PADDING)
+    return ciphertext, {
+        "cipher": "AES-256-GCM",
+        "wrapped_key": wrapped_key,
+        "nonce": nonce
+    }
+
+def hybrid_decrypt(ciphertext: bytes, envelope: dict, private_key, sender: Person, receiver: Person) -> bytes:
+    """Reverses hybrid_encrypt with the receiver's private key."""
+    private_key = load_private_key(private_key)
+    with METRICS.stage("encrypted.rsa_decrypt", len(envelope["wrapped_key"])):
+        data_key = private_key.decrypt(envelope["wrapped_key"], OAEP_PADDING)
+    with METRICS.stage("encrypted.aes_decrypt", len(ciphertext)):
+        return AESGCM(data_key).decrypt(envelope["nonce"], ciphertext, envelope_associated_data(sender, receiver))
+
 """Using English Wikipedia's description of how RSA encryption works,
    simulate the encryption, sending, recieving, and decrypting of
    RSA-encrypted messages."""
@@ -24,8 +82,18 @@ class EncryptedMessenger:
     def __init__(self, network: CommunicationNetwork):
         self.network = network
         
-    def encrypt_message(self, sender: Person, receiver: Person, metadata: MessageMetadata, message: str) -> Message:
-        """Encrypts a message using RSA and returns an encrypted Message object."""
+    def encrypt_message(self, sender: Person, receiver: Person, metadata: MessageMetadata, message: str,
+                        mode: str = "rsa") -> Message:
+        """Encrypts a message and returns an encrypted Message object.
+
+        mode "rsa" encrypts the message directly with RSA-OAEP, which only fits
+        short messages (about 190 bytes for a 2048-bit key). mode "hybrid"
+        encrypts the body with AES-256-GCM under a random key and wraps only
+        that key with RSA-OAEP, so any length works.
+        """
+        if mode not in ENCRYPTION_MODES:
+            raise ValueError(f"Unknown encryption mode {mode!r}; expected one of {ENCRYPTION_MODES}.")
+
         public_key = receiver.public_key  # Use the receiver's public key for encryption
         if not public_key:
             raise ValueError("Receiver's public key is missing!")
@@ -34,22 +102,34 @@ class EncryptedMessenger:
         if not private_key:
             raise ValueError("Sender's private key is missing!")
 
-        # Generate an RSA key pair if none exist
-        if not sender.public_key:
-            sender.generate_rsa_keys()  
-        if not receiver.public_key:
-            receiver.generate_rsa_keys() 
-
-        ciphertext = public_key.encrypt(
-            message.encode(), padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
-        )
+        if mode == "hybrid":
+            ciphertext, envelope = hybrid_encrypt(message.encode(), sender, receiver)
+            additional_data = {"encryption_mode": mode, **envelope}
+        else:
+            public_key = load_public_key(public_key)
+            plaintext = message.encode()
+            with METRICS.stage("encrypted.rsa_encrypt", len(plaintext)):
+                ciphertext = public_key.encrypt(plaintext, OAEP_PADDING)
+            additional_data = {"encryption_mode": mode}
 
         metadata = MessageMetadata(
             message_type=MessageType.ENCRYPTED,
             original_length=len(message), 
+            additional_data=additional_data
         )
         return Message(sender, receiver, metadata, ciphertext)   
 
+    async def encrypt_message_async(self, sender: Person, receiver: Person, metadata: MessageMetadata, message: str,
+                                    mode: str = "rsa", executor: Optional[Executor] = None) -> Message:
+        """encrypt_message run in a thread executor (the loop's default if None)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.encrypt_message, sender, receiver, metadata, message, mode)
+
+    async def decrypt_message_async(self, sender: Person, message: Message, executor: Optional[Executor] = None) -> str:
+        """decrypt_message run in a thread executor (the loop's default if None)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.decrypt_message, sender, message)
+
     def decrypt_message(self, sender: Person, message: Message) -> str:  
         """Decrypts an encrypted message using the recipient's private key."""
         if message.metadata.message_type != MessageType.ENCRYPTED:
@@ -59,9 +139,15 @@ class EncryptedMessenger:
         if not private_key:
             raise ValueError("Sender's private key is missing!")
 
-        plaintext = private_key.decrypt(
-            message, padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
-        ).decode() 
+        additional_data = message.metadata.additional_data or {}
+
+        if additional_data.get("encryption_mode", "rsa") == "hybrid":
+            plaintext = hybrid_decrypt(message.body, additional_data, private_key, message.sender, message.receiver).decode()
+            return plaintext
+
+        private_key = load_private_key(private_key)
+        with METRICS.stage("encrypted.rsa_decrypt", len(message.body)):
+            plaintext = private_key.decrypt(message.body, OAEP_PADDING).decode()
         return plaintext
         
 if __name__ == "__main__":
@@ -91,5 +177,9 @@ if __name__ == "__main__":
 
     decrypted_message = messenger.decrypt_message(bob, encrypted_message)
     print("Decrypted Message:", decrypted_message)
+
+    long_message = "This message is far too long for RSA-OAEP alone. " * 20
+    hybrid_message = messenger.encrypt_message(alice, bob, metadata, long_message, mode="hybrid")
+    print("Hybrid decryption matches:", messenger.decrypt_message(bob, hybrid_message) == long_message)
     
    
@@ -0,0 +1,73 @@
+import asyncio
+import unittest
+from cryptography.exceptions import InvalidTag
+from structures import CommunicationNetwork, Person, MessageMetadata, MessageType
+from send_message import EncryptedMessenger, envelope_associated_data, generate_rsa_keys
+
+class TestEncryptedMessenger(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Generate the RSA keys once; key generation dominates the test time."""
+        cls.alice_keys = generate_rsa_keys()
+        cls.bob_keys = generate_rsa_keys()
+
+    def setUp(self):
+        self.network = CommunicationNetwork()
+        self.messenger = EncryptedMessenger(self.network)
+        self.alice = Person("Alice", private_key=self.alice_keys[0], public_key=self.alice_keys[1])
+        self.bob = Person("Bob", private_key=self.bob_keys[0], public_key=self.bob_keys[1])
+        self.network.add_person(self.alice)
+        self.network.add_person(self.bob)
+        self.metadata = MessageMetadata(MessageType.PLAIN)
+
+    def test_rsa_round_trip(self):
+        """Test that a short message decrypts from the message body."""
+        message = self.messenger.encrypt_message(self.alice, self.bob, self.metadata, "This is a secret message!")
+        self.assertEqual(message.metadata.message_type, MessageType.ENCRYPTED)
+        self.assertEqual(self.messenger.decrypt_message(self.bob, message), "This is a secret message!")
+
+    def test_hybrid_round_trip(self):
+        """Test that hybrid mode handles messages far beyond the RSA-OAEP size limit."""
+        long_message = "A long secret message. " * 1000
+        message = self.messenger.encrypt_message(self.alice, self.bob, self.metadata, long_message, mode="hybrid")
+
+        additional_data = message.metadata.additional_data
+        self.assertEqual(additional_data["encryption_mode"], "hybrid")
+        self.assertEqual(len(additional_data["wrapped_key"]), 256)
+        self.assertEqual(len(additional_data["nonce"]), 12)
+        self.assertEqual(self.messenger.decrypt_message(self.bob, message), long_message)
+
+    def test_hybrid_tampered_body(self):
+        """Test that AES-GCM authentication rejects a modified ciphertext."""
+        message = self.messenger.encrypt_message(self.alice, self.bob, self.metadata, "secret", mode="hybrid")
+        message.body = bytes([message.body[0] ^ 1]) + message.body[1:]
+        with self.assertRaises(InvalidTag):
+            self.messenger.decrypt_message(self.bob, message)
+
+    def test_associated_data_is_unambiguous(self):
+        """Test that IDs containing separators cannot make two sender/receiver pairs share associated data."""
+        self.assertNotEqual(envelope_associated_data(Person("a->b"), Person("c")),
+                            envelope_associated_data(Person("a"), Person("b->c")))
+        self.assertNotEqual(envelope_associated_data(Person("ab"), Person("c")),
+                            envelope_associated_data(Person("a"), Person("bc")))
+
+    def test_rsa_mode_rejects_long_message(self):
+        """Test that plain RSA mode still refuses messages longer than OAEP allows."""
+        with self.assertRaises(ValueError):
+            self.messenger.encrypt_message(self.alice, self.bob, self.metadata, "x" * 500)
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            self.messenger.encrypt_message(self.alice, self.bob, self.metadata, "secret", mode="xor")
+
+    def test_async_round_trip(self):
+        """Test that the async counterparts encrypt and decrypt off the event loop."""
+        async def round_trip():
+            message = await self.messenger.encrypt_message_async(self.alice, self.bob, self.metadata, "async secret",
+                                                                 mode="hybrid")
+            return await self.messenger.decrypt_message_async(self.bob, message)
+        self.assertEqual(asyncio.run(round_trip()), "async secret")
+
+if __name__ == "__main__":
+    unittest.main()
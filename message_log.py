@@ -0,0 +1,330 @@
+"""Append-only, segmented on-disk log of wire-framed messages.
+
+Each segment is a file of back-to-back frames from wire.py. Appends go
+out as one write() per segment touched, and reads go through mmap. An
+in-memory index maps sender, receiver and message type to frame
+positions, so filtered queries seek straight to matching frames.
+"""
+import json
+import mmap
+import os
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from structures import CompactMessage, Message, MessageType, MESSAGE_TYPE_CODES
+from wire import WireFrame, decode_envelope, decode_message, encode_batch, iter_frames
+
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+SEGMENT_SUFFIX = ".log"
+COMPACT_SUFFIX = ".compact"
+# Written atomically once every compacted segment is on disk; its presence commits the swap
+COMPACT_MANIFEST = "compact.manifest"
+
+LogPosition = namedtuple("LogPosition", ["segment", "offset"])
+
+# Positions are packed into one int so the index can live in compact arrays
+_OFFSET_BITS = 40
+
+class MessageLog:
+    """Segment-file message log with a sender/receiver/type index.
+
+    Frames returned by reads are views into memory-mapped segments, so
+    their bodies stay valid only while the log is open.
+    """
+
+    def __init__(self, directory: str, segment_size: int = DEFAULT_SEGMENT_SIZE, sync: bool = False):
+        if segment_size <= 0:
+            raise ValueError("segment_size must be positive.")
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync = sync
+        os.makedirs(directory, exist_ok=True)
+        self._recover_compaction()
+
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._segments: List[int] = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+        if not self._segments:
+            self._segments.append(0)
+        self._active = None
+        self._open_active(self._segments[-1])
+        self._rebuild_index()
+
+    @property
+    def segments(self) -> List[int]:
+        return list(self._segments)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self) -> "MessageLog":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, message: Union[Message, CompactMessage]) -> LogPosition:
+        return self.append_many([message])[0]
+
+    def append_many(self, messages: Iterable[Union[Message, CompactMessage]]) -> List[LogPosition]:
+        """Append messages in order, rotating segments as they fill; returns where each landed."""
+        messages = list(messages)
+        if not messages:
+            return []
+        buffer, ends = encode_batch(messages)
+        view = memoryview(buffer)
+
+        positions = []
+        chunk_start = 0
+        for index, end in enumerate(ends):
+            start = ends[index - 1] if index else 0
+            # A frame starts a new segment if it would overflow a non-empty one
+            if self._active_size + (end - chunk_start) > self.segment_size and self._active_size + (start - chunk_start) > 0:
+                self._write(view[chunk_start:start])
+                chunk_start = start
+                self.rotate()
+            position = LogPosition(self._segments[-1], self._active_size + start - chunk_start)
+            self._index_message(messages[index], position)
+            positions.append(position)
+        self._write(view[chunk_start:])
+        return positions
+
+    def read(self, position: LogPosition) -> WireFrame:
+        segment, offset = position
+        frame, _ = decode_message(self._map(segment, offset + 1), offset)
+        return frame
+
+    def query(self, sender_id: Optional[str] = None, receiver_id: Optional[str] = None,
+              message_type: Optional[MessageType] = None) -> Iterator[WireFrame]:
+        """Yield matching frames in log order, reading only the indexed positions."""
+        criteria = []
+        if sender_id is not None:
+            criteria.append(self._by_sender.get(sender_id, ()))
+        if receiver_id is not None:
+            criteria.append(self._by_receiver.get(receiver_id, ()))
+        if message_type is not None:
+            criteria.append(self._by_type.get(MESSAGE_TYPE_CODES[message_type], ()))
+        if not criteria:
+            yield from self
+            return
+
+        # Every index array is in log order, i.e. sorted, so walk the smallest and
+        # bisect into the others; the cost follows the smallest list, not the whole index
+        criteria.sort(key=len)
+        smallest, others = criteria[0], criteria[1:]
+        # Index arrays are appended in log order, so they are sorted: walk the smallest and
+        # bisect into the others, each search resuming where the previous one stopped
+        starts = [0] * len(others)
+        for packed in smallest:
+            for index, positions in enumerate(others):
+                start = starts[index] = bisect_left(positions, packed, starts[index])
+                if start == len(positions) or positions[start] != packed:
+                    break
+            else:
+                yield self.read(_unpack(packed))
+
+    def __iter__(self) -> Iterator[WireFrame]:
+        for segment in self._segments:
+            if self._segment_size(segment):
+                yield from iter_frames(self._map(segment, self._segment_size(segment)))
+
+    def rotate(self) -> int:
+        """Seal the active segment and start a new one; returns the new segment number."""
+        if self._active_size == 0:
+            return self._segments[-1]
+        self._segments.append(self._segments[-1] + 1)
+        self._open_active(self._segments[-1])
+        return self._segments[-1]
+
+    def compact(self, keep: Optional[Callable[[WireFrame], bool]] = None) -> int:
+        """Rewrite sealed segments, dropping frames keep rejects and merging small segments.
+
+        Returns the number of bytes reclaimed. The active segment's frames are left
+        untouched, though it is renumbered if the outputs need its number. The swap
+        is committed by a manifest, so a crash part-way is finished on the next open.
+        """
+        sealed = self._segments[:-1]
+        if not sealed:
+            return 0
+        before = sum(self._segment_size(segment) for segment in sealed)
+
+        # Outputs are numbered up from the first sealed segment, so ordering is preserved
+        outputs: List[int] = []
+        output = None
+        output_size = 0
+        for segment in sealed:
+            data = self._map(segment, self._segment_size(segment))
+            offset = 0
+            while offset < len(data):
+                frame, end = decode_message(data, offset)
+                if keep is None or keep(frame):
+                    size = end - offset
+                    if output is None or (output_size and output_size + size > self.segment_size):
+                        if output is not None:
+                            self._close_output(output)
+                        outputs.append(sealed[0] + len(outputs))
+                        output = open(self._path(outputs[-1]) + COMPACT_SUFFIX, "wb", buffering=0)
+                        output_size = 0
+                    output.write(data[offset:end])
+                    output_size += size
+                offset = end
+        if output is not None:
+            self._close_output(output)
+
+        # A smaller segment_size can need more outputs than there were sealed
+        # segments; the active segment then moves up past them
+        active = self._segments[-1]
+        new_active = max(active, sealed[0] + len(outputs))
+        after = sum(os.path.getsize(self._path(segment) + COMPACT_SUFFIX) for segment in outputs)
+
+        self._active.close()
+        self._active = None
+        self._release_maps()
+        plan = {"sealed": sealed, "outputs": outputs, "active": [active, new_active]}
+        manifest = os.path.join(self.directory, COMPACT_MANIFEST)
+        with open(manifest + ".tmp", "w") as handle:
+            json.dump(plan, handle)
+            if self.sync:
+                handle.flush()
+                os.fsync(handle.fileno())
+        os.replace(manifest + ".tmp", manifest)
+        self._apply_compaction(plan)
+
+        self._segments = outputs + [new_active]
+        self._open_active(new_active)
+        self._rebuild_index()
+        return before - after
+
+    def flush(self):
+        """Force appended frames to disk."""
+        os.fsync(self._active.fileno())
+
+    def close(self):
+        if self._active is not None:
+            self._active.close()
+            self._active = None
+        self._release_maps()
+
+    def _recover_compaction(self):
+        """Finish a compaction whose manifest was committed, and drop files from one that was not."""
+        manifest = os.path.join(self.directory, COMPACT_MANIFEST)
+        if os.path.exists(manifest):
+            with open(manifest) as handle:
+                self._apply_compaction(json.load(handle))
+        for name in os.listdir(self.directory):
+            if name.endswith(COMPACT_SUFFIX) or name == COMPACT_MANIFEST + ".tmp":
+                os.remove(os.path.join(self.directory, name))
+
+    def _apply_compaction(self, plan: dict):
+        # Every step checks what is already done, so a crash at any point can be replayed on open
+        outputs = set(plan["outputs"])
+        active, new_active = plan["active"]
+        for segment in plan["sealed"]:
+            if segment not in outputs and os.path.exists(self._path(segment)):
+                os.remove(self._path(segment))
+        # The old active number may be an output's final name; move it only before that output lands
+        if new_active != active and os.path.exists(self._path(active)) and (
+                active not in outputs or os.path.exists(self._path(active) + COMPACT_SUFFIX)):
+            os.replace(self._path(active), self._path(new_active))
+        for segment in plan["outputs"]:
+            if os.path.exists(self._path(segment) + COMPACT_SUFFIX):
+                os.replace(self._path(segment) + COMPACT_SUFFIX, self._path(segment))
+        if self.sync and hasattr(os, "O_DIRECTORY"):
+            descriptor = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
+        os.remove(os.path.join(self.directory, COMPACT_MANIFEST))
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:08d}{SEGMENT_SUFFIX}")
+
+    def _open_active(self, segment: int):
+        if self._active is not None:
+            self._active.close()
+        # Unbuffered, so each append batch is a single write() per segment
+        self._active = open(self._path(segment), "ab", buffering=0)
+        self._active_size = self._active.tell()
+
+    def _write(self, data: memoryview):
+        if not data:
+            return
+        self._active.write(data)
+        self._active_size += len(data)
+        if self.sync:
+            os.fsync(self._active.fileno())
+
+    def _close_output(self, output):
+        if self.sync:
+            os.fsync(output.fileno())
+        output.close()
+
+    def _segment_size(self, segment: int) -> int:
+        if segment == self._segments[-1]:
+            return self._active_size
+        return os.path.getsize(self._path(segment))
+
+    def _map(self, segment: int, needed: int) -> mmap.mmap:
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < needed:
+            # The active segment grows; remap it rather than closing a map frames may still view
+            with open(self._path(segment), "rb") as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return mapped
+
+    def _release_maps(self):
+        for mapped in self._maps.values():
+            try:
+                mapped.close()
+            except BufferError:
+                # Frames handed out still view this map; it closes once they are collected
+                pass
+        self._maps.clear()
+
+    def _rebuild_index(self):
+        self._by_sender: Dict[str, array] = {}
+        self._by_receiver: Dict[str, array] = {}
+        self._by_type: Dict[int, array] = {}
+        self._count = 0
+        for segment in self._segments:
+            size = self._segment_size(segment)
+            if not size:
+                continue
+            data = self._map(segment, size)
+            offset = 0
+            while offset < size:
+                try:
+                    sender_id, receiver_id, message_type, end = decode_envelope(data, offset)
+                except ValueError:
+                    # A torn final write; drop it so appends resume on a frame boundary
+                    if segment != self._segments[-1]:
+                        raise
+                    self._release_maps()
+                    self._active.truncate(offset)
+                    self._active_size = offset
+                    break
+                self._index(sender_id, receiver_id, message_type, LogPosition(segment, offset))
+                offset = end
+
+    def _index_message(self, message: Union[Message, CompactMessage], position: LogPosition):
+        if isinstance(message, Message):
+            sender_id, receiver_id = message.sender.id, message.receiver.id
+        else:
+            sender_id, receiver_id = message.sender_id, message.receiver_id
+        self._index(sender_id, receiver_id, message.metadata.message_type, position)
+
+    def _index(self, sender_id: str, receiver_id: str, message_type: MessageType, position: LogPosition):
+        packed = (position.segment << _OFFSET_BITS) | position.offset
+        self._by_sender.setdefault(sender_id, array("q")).append(packed)
+        self._by_receiver.setdefault(receiver_id, array("q")).append(packed)
+        self._by_type.setdefault(MESSAGE_TYPE_CODES[message_type], array("q")).append(packed)
+        self._count += 1
+
+def _unpack(packed: int) -> LogPosition:
+    return LogPosition(packed >> _OFFSET_BITS, packed & ((1 << _OFFSET_BITS) - 1))
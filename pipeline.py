@@ -0,0 +1,250 @@
+"""Composable message pipeline: compress -> sign -> encrypt, recorded in MessageMetadata.
+
+Each stage turns the payload bytes into new payload bytes and returns the
+parameters needed to undo it. The stage stack (name plus parameters,
+innermost first) is stored in additional_data["pipeline"], so the
+receiving side can unwind it without knowing how the sender was set up.
+The compress stage picks RLE, FFT or no compression from a sample of the
+payload (see select_codec).
+"""
+import math
+import os
+import sys
+from collections import namedtuple
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+for folder in ("lionel", "matthew", "victor", "kaena"):
+    sys.path.append(os.path.join(ROOT, folder))
+
+from structures import CommunicationNetwork, Message, MessageMetadata, MessageType, Person
+from compressed_messages import rle_decode_bytes, rle_encode_bytes
+from fft_compressed_communication import fft_decode_coefficients, fft_encode_coefficients
+from send_message import hybrid_decrypt, hybrid_encrypt
+from signed_messages import SignedMessenger, key_algorithm
+
+CODECS = ("none", "rle", "fft")
+
+# Relative CPU cost per input byte; a codec must save more than
+# CPU_COST_WEIGHT * cost of the payload size to be worth running
+CODEC_CPU_COST = {"none": 0.0, "rle": 1.0, "fft": 5.0}
+CPU_COST_WEIGHT = 0.05
+
+# Payloads this small never repay a codec's setup cost
+MIN_COMPRESS_LENGTH = 64
+SAMPLE_WINDOWS = 4
+SAMPLE_WINDOW_SIZE = 1024
+
+# A sample above this many bits per byte, without runs of at least
+# MIN_MEAN_RUN_LENGTH, looks encrypted or already compressed and is sent as is
+ENTROPY_CUTOFF = 7.5
+MIN_MEAN_RUN_LENGTH = 2.0
+
+CodecChoice = namedtuple("CodecChoice", ["codec", "expected_size", "entropy", "mean_run_length"])
+
+@dataclass
+class StageContext:
+    sender: Person
+    receiver: Person
+    # Encoding of the original body, or None when it was bytes
+    text_encoding: Optional[str]
+    signer: SignedMessenger
+
+def sample_payload(payload: bytes) -> np.ndarray:
+    """A few evenly spaced windows of the payload; windows keep runs intact, unlike strided sampling."""
+    values = np.frombuffer(payload, dtype=np.uint8)
+    if values.size <= SAMPLE_WINDOWS * SAMPLE_WINDOW_SIZE:
+        return values
+    starts = np.linspace(0, values.size - SAMPLE_WINDOW_SIZE, SAMPLE_WINDOWS).astype(np.int64)
+    return np.concatenate([values[start:start + SAMPLE_WINDOW_SIZE] for start in starts])
+
+def select_codec(payload: bytes, is_text: bool = False, allow_lossy: bool = False,
+                 fft_ratio: float = 0.5) -> CodecChoice:
+    """Pick the codec with the best expected size after a CPU-cost penalty; "none" if nothing pays off.
+
+    Payloads whose sample has byte entropy of at least ENTROPY_CUTOFF and no
+    runs to speak of are rejected up front, before any size is estimated.
+    Otherwise RLE size is estimated from the sample's run count (one value
+    byte and a varint length per run). FFT is only considered for text when
+    lossy compression is allowed, and keeps about fft_ratio of the input bytes.
+    """
+    length = len(payload)
+    sample = sample_payload(payload)
+    if sample.size == 0:
+        return CodecChoice("none", length, 0.0, 0.0)
+
+    counts = np.bincount(sample, minlength=256)
+    probabilities = counts[counts > 0] / sample.size
+    entropy = float(-(probabilities * np.log2(probabilities)).sum())
+    runs = 1 + int(np.count_nonzero(np.diff(sample)))
+    mean_run_length = sample.size / runs
+
+    if length < MIN_COMPRESS_LENGTH:
+        return CodecChoice("none", length, entropy, mean_run_length)
+    if entropy >= ENTROPY_CUTOFF and mean_run_length < MIN_MEAN_RUN_LENGTH:
+        return CodecChoice("none", length, entropy, mean_run_length)
+
+    varint_bytes = max(1, math.ceil(math.log2(mean_run_length + 1) / 7))
+    expected = {
+        "none": length,
+        "rle": 1 + length / mean_run_length * (1 + varint_bytes),
+    }
+    if is_text and allow_lossy:
+        expected["fft"] = 18 + length * fft_ratio
+    scores = {codec: size * (1 + CPU_COST_WEIGHT * CODEC_CPU_COST[codec]) for codec, size in expected.items()}
+    codec = min(scores, key=scores.get)
+    if scores[codec] >= length:
+        codec = "none"
+    return CodecChoice(codec, int(expected[codec]), entropy, mean_run_length)
+
+class CompressStage:
+    name = "compress"
+
+    def __init__(self, codec: str = "auto", allow_lossy: bool = False, fft_ratio: float = 0.5):
+        if codec != "auto" and codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r}; expected 'auto' or one of {CODECS}.")
+        self.codec = codec
+        self.allow_lossy = allow_lossy
+        self.fft_ratio = fft_ratio
+
+    def apply(self, payload: bytes, context: StageContext) -> Tuple[bytes, Dict]:
+        is_text = context.text_encoding is not None
+        codec = self.codec
+        if codec == "auto":
+            codec = select_codec(payload, is_text, self.allow_lossy, self.fft_ratio).codec
+        if codec == "fft" and not is_text:
+            raise ValueError("FFT compression only applies to text bodies.")
+
+        if codec == "rle":
+            compressed = rle_encode_bytes(payload)
+        elif codec == "fft":
+            compressed = fft_encode_coefficients(payload.decode(context.text_encoding), self.fft_ratio)
+        else:
+            compressed = payload
+        # Never ship a payload that compression made bigger
+        if len(compressed) >= len(payload):
+            codec, compressed = "none", payload
+        return compressed, {"codec": codec, "original_length": len(payload)}
+
+    @staticmethod
+    def invert(payload: bytes, params: Dict, context: StageContext) -> bytes:
+        if params["codec"] == "rle":
+            return rle_decode_bytes(payload)
+        if params["codec"] == "fft":
+            return fft_decode_coefficients(payload).encode(context.text_encoding)
+        return payload
+
+    @staticmethod
+    def message_type(params: Dict) -> MessageType:
+        return {"rle": MessageType.RLE_COMPRESSED, "fft": MessageType.FFT_COMPRESSED}.get(params["codec"],
+                                                                                          MessageType.PLAIN)
+
+class SignStage:
+    name = "sign"
+
+    def apply(self, payload: bytes, context: StageContext) -> Tuple[bytes, Dict]:
+        if not context.sender.private_key:
+            raise ValueError("Sender's private key is missing!")
+        signer = context.signer
+        message_hash = signer.calculate_message_hash(payload)
+        signature = signer.encrypt_hash(message_hash, context.sender.private_key, prehashed=True)
+        algorithm = key_algorithm(signer.key_cache.load_private_key(context.sender.private_key))
+        return payload, {"signature": signature, "hash": message_hash, "signature_algorithm": algorithm}
+
+    @staticmethod
+    def invert(payload: bytes, params: Dict, context: StageContext) -> bytes:
+        signer = context.signer
+        message_hash = signer.calculate_message_hash(payload)
+        if message_hash != params["hash"] or not signer.verify_signature(
+                message_hash, params["signature"], context.sender.public_key, True, params["signature_algorithm"]):
+            raise ValueError("Signature verification failed.")
+        return payload
+
+    @staticmethod
+    def message_type(params: Dict) -> MessageType:
+        return MessageType.SIGNED
+
+class EncryptStage:
+    name = "encrypt"
+
+    def apply(self, payload: bytes, context: StageContext) -> Tuple[bytes, Dict]:
+        if not context.receiver.public_key:
+            raise ValueError("Receiver's public key is missing!")
+        return hybrid_encrypt(payload, context.sender, context.receiver)
+
+    @staticmethod
+    def invert(payload: bytes, params: Dict, context: StageContext) -> bytes:
+        if not context.receiver.private_key:
+            raise ValueError("Receiver's private key is missing!")
+        return hybrid_decrypt(payload, params, context.receiver.private_key, context.sender, context.receiver)
+
+    @staticmethod
+    def message_type(params: Dict) -> MessageType:
+        return MessageType.ENCRYPTED
+
+STAGES = {stage.name: stage for stage in (CompressStage, SignStage, EncryptStage)}
+
+Stage = Union[CompressStage, SignStage, EncryptStage]
+
+class Pipeline:
+    def __init__(self, network: CommunicationNetwork, stages: Sequence[Union[str, Stage]] = ("compress", "sign", "encrypt"),
+                 key_cache_size: int = 1024):
+        """stages run in order on send and in reverse on receive; names use each stage's defaults."""
+        self.network = network
+        self.stages: List[Stage] = []
+        for stage in stages:
+            if isinstance(stage, str):
+                if stage not in STAGES:
+                    raise ValueError(f"Unknown pipeline stage {stage!r}; expected one of {sorted(STAGES)}.")
+                stage = STAGES[stage]()
+            self.stages.append(stage)
+        self.signer = SignedMessenger(network, key_cache_size)
+
+    def send(self, sender_id: str, receiver_id: str, message_body: Union[str, bytes]) -> Message:
+        sender = self.network.get_person(sender_id)
+        receiver = self.network.get_person(receiver_id)
+        if not sender or not receiver:
+            raise ValueError("Sender or receiver not found in the network.")
+
+        is_text = isinstance(message_body, str)
+        context = StageContext(sender, receiver, "utf-8" if is_text else None, self.signer)
+        payload = message_body.encode("utf-8") if is_text else bytes(message_body)
+        original_bytes = len(payload)
+
+        stack = []
+        compression_ratio = None
+        message_type = MessageType.PLAIN
+        for stage in self.stages:
+            payload, params = stage.apply(payload, context)
+            stack.append({"stage": stage.name, **params})
+            message_type = stage.message_type(params)
+            if stage.name == "compress" and params["codec"] != "none":
+                compression_ratio = len(payload) / params["original_length"]
+
+        metadata = MessageMetadata(
+            message_type=message_type,
+            original_length=len(message_body),
+            compression_ratio=compression_ratio,
+            additional_data={"pipeline": stack, "text_encoding": context.text_encoding,
+                             "original_bytes": original_bytes}
+        )
+        return Message(sender, receiver, metadata, payload)
+
+    def receive(self, message: Message) -> Union[str, bytes]:
+        """Unwind the recorded stage stack, verifying and decrypting as needed."""
+        additional_data = message.metadata.additional_data or {}
+        if "pipeline" not in additional_data:
+            raise ValueError("Message was not sent through a pipeline.")
+        context = StageContext(message.sender, message.receiver, additional_data.get("text_encoding"), self.signer)
+        payload = bytes(message.body)
+        for params in reversed(additional_data["pipeline"]):
+            stage = STAGES.get(params["stage"])
+            if stage is None:
+                raise ValueError(f"Unknown pipeline stage {params['stage']!r}.")
+            payload = stage.invert(payload, params, context)
+        if context.text_encoding:
+            return payload.decode(context.text_encoding)
+        return payload
@@ -0,0 +1,178 @@
+"""Hop-by-hop delivery of messages along CommunicationNetwork.get_path routes.
+
+The engine is a discrete-event simulation. Queued messages wait in one
+heap ordered by the simulated time they are ready to leave their current
+node. Each step, every node forwards one batch of the messages ready at
+the earliest pending time to the next hop on each message's route.
+Simulated time comes from a per-link latency and bandwidth model. A link
+transmits one message at a time. Because steps run in time order, the
+messages sharing a link go out in the order they became ready.
+"""
+import heapq
+from collections import namedtuple
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from structures import CommunicationNetwork, CompactMessage, Message
+from wire import encoded_size
+
+@dataclass(frozen=True)
+class LinkModel:
+    """Cost of one hop: fixed latency (seconds) plus size / bandwidth (bytes per second, None = unlimited)."""
+    latency: float = 0.001
+    bandwidth: Optional[float] = None
+
+    def __post_init__(self):
+        if self.latency < 0:
+            raise ValueError("Link latency cannot be negative.")
+        if self.bandwidth is not None and self.bandwidth <= 0:
+            raise ValueError("Link bandwidth must be positive.")
+
+Delivery = namedtuple("Delivery", ["message", "route", "sent_at", "delivered_at"])
+DeliveryStats = namedtuple("DeliveryStats", ["delivered", "in_flight", "hops", "bytes_forwarded",
+                                             "mean_latency", "max_latency", "max_queue_depth", "rounds"])
+
+@dataclass(slots=True)
+class _Transit:
+    message: Union[Message, CompactMessage]
+    route: List[str]
+    size: int
+    sent_at: float
+    ready_at: float
+    hop: int = 0
+
+class DeliveryEngine:
+    def __init__(self, network: CommunicationNetwork, link: Union[LinkModel, Callable[[str, str], LinkModel]] = LinkModel(),
+                 batch_size: Optional[int] = None):
+        """link is one model for every hop or a function (from_id, to_id) -> LinkModel."""
+        if batch_size is not None and batch_size <= 0:
+            raise ValueError("batch_size must be positive.")
+        self.network = network
+        self.link = link
+        self.batch_size = batch_size
+        self.deliveries: List[Delivery] = []
+        # (ready_at, submission order, node, transit); the order keeps ties first-in, first-out
+        self._pending: List[Tuple[float, int, str, _Transit]] = []
+        self._sequence = 0
+        self._queue_depths: Dict[str, int] = {}
+        self._link_free_at: Dict[Tuple[str, str], float] = {}
+        self._in_flight = 0
+        self._hops = 0
+        self._bytes_forwarded = 0
+        self._max_queue_depth = 0
+        self._rounds = 0
+
+    def submit(self, message: Union[Message, CompactMessage], sent_at: float = 0.0) -> List[str]:
+        """Queue a message at its sender and return the route it will take."""
+        if isinstance(message, Message):
+            sender_id, receiver_id = message.sender.id, message.receiver.id
+        else:
+            sender_id, receiver_id = message.sender_id, message.receiver_id
+        route = self.network.get_path(sender_id, receiver_id)
+        if not route:
+            raise ValueError(f"No route from {sender_id} to {receiver_id}.")
+
+        transit = _Transit(message, route, encoded_size(message), sent_at, sent_at)
+        if len(route) == 1:
+            self.deliveries.append(Delivery(message, route, sent_at, sent_at))
+        else:
+            self._enqueue(sender_id, transit)
+        return route
+
+    def submit_many(self, messages: Iterable[Union[Message, CompactMessage]], sent_at: float = 0.0) -> List[List[str]]:
+        return [self.submit(message, sent_at) for message in messages]
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def step(self) -> int:
+        """Forward one batch from every node holding messages ready at the earliest pending time.
+
+        Returns how many messages moved.
+        """
+        pending = self._pending
+        if not pending:
+            return 0
+        now = pending[0][0]
+        batch: List[Tuple[str, _Transit]] = []
+        if self.batch_size is None:
+            while pending and pending[0][0] == now:
+                _, _, node, transit = heapq.heappop(pending)
+                batch.append((node, transit))
+        else:
+            deferred = []
+            taken: Dict[str, int] = {}
+            while pending and pending[0][0] == now:
+                entry = heapq.heappop(pending)
+                count = taken.get(entry[2], 0)
+                if count >= self.batch_size:
+                    deferred.append(entry)
+                else:
+                    taken[entry[2]] = count + 1
+                    batch.append((entry[2], entry[3]))
+            for entry in deferred:
+                heapq.heappush(pending, entry)
+
+        # Each link's model is looked up once per step
+        shared_link = self.link if isinstance(self.link, LinkModel) else None
+        links: Dict[Tuple[str, str], LinkModel] = {}
+        link_free_at = self._link_free_at
+        queue_depths = self._queue_depths
+        forwarded = 0
+        for node, transit in batch:
+            queue_depths[node] -= 1
+            next_hop = transit.route[transit.hop + 1]
+            link = shared_link
+            if link is None:
+                link = links.get((node, next_hop))
+                if link is None:
+                    link = links[(node, next_hop)] = self.link(node, next_hop)
+            finished = transit.ready_at
+            if link.bandwidth is not None:
+                finished = max(finished, link_free_at.get((node, next_hop), 0.0)) + transit.size / link.bandwidth
+                link_free_at[(node, next_hop)] = finished
+            transit.ready_at = finished + link.latency
+            transit.hop += 1
+            forwarded += transit.size
+
+            # Arrivals are never ready before now, so later steps still see every link in time order
+            if transit.hop == len(transit.route) - 1:
+                self._in_flight -= 1
+                self.deliveries.append(Delivery(transit.message, transit.route, transit.sent_at, transit.ready_at))
+            else:
+                self._enqueue(next_hop, transit, count=False)
+        self._hops += len(batch)
+        self._bytes_forwarded += forwarded
+        self._rounds += 1
+        return len(batch)
+
+    def run(self, max_rounds: Optional[int] = None) -> List[Delivery]:
+        """Step until every queued message is delivered (or max_rounds elapse); returns all deliveries."""
+        rounds = 0
+        while self._in_flight and (max_rounds is None or rounds < max_rounds):
+            self.step()
+            rounds += 1
+        return self.deliveries
+
+    def stats(self) -> DeliveryStats:
+        latencies = [delivery.delivered_at - delivery.sent_at for delivery in self.deliveries]
+        return DeliveryStats(
+            delivered=len(self.deliveries),
+            in_flight=self._in_flight,
+            hops=self._hops,
+            bytes_forwarded=self._bytes_forwarded,
+            mean_latency=sum(latencies) / len(latencies) if latencies else 0.0,
+            max_latency=max(latencies, default=0.0),
+            max_queue_depth=self._max_queue_depth,
+            rounds=self._rounds
+        )
+
+    def _enqueue(self, node: str, transit: _Transit, count: bool = True):
+        heapq.heappush(self._pending, (transit.ready_at, self._sequence, node, transit))
+        self._sequence += 1
+        depth = self._queue_depths[node] = self._queue_depths.get(node, 0) + 1
+        if count:
+            self._in_flight += 1
+        if depth > self._max_queue_depth:
+            self._max_queue_depth = depth
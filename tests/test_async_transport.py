@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from structures import CommunicationNetwork, Person, CompactMessage, CompactMessageMetadata, MessageType
+from async_transport import InProcessTransport
+
+def make_message(sender_id, receiver_id, body=b"hello"):
+    return CompactMessage(sender_id, receiver_id, CompactMessageMetadata(MessageType.PLAIN), body)
+
+def test_send_and_receive():
+    async def exchange():
+        transport = InProcessTransport()
+        await transport.send(make_message("alice", "bob", b"first"))
+        await transport.send(make_message("carol", "bob", b"second"))
+        assert transport.pending("bob") == 2
+        received = [await transport.receive("bob"), await transport.receive("bob")]
+        return transport, received
+
+    transport, received = asyncio.run(exchange())
+    assert [message.body for message in received] == [b"first", b"second"]
+    stats = transport.latency_stats()
+    assert stats.count == 2
+    assert 0 <= stats.p50 <= stats.max
+
+def test_bounded_inbox_applies_backpressure():
+    async def fill():
+        transport = InProcessTransport(maxsize=2)
+        transport.send_nowait(make_message("alice", "bob"))
+        transport.send_nowait(make_message("alice", "bob"))
+        with pytest.raises(asyncio.QueueFull):
+            transport.send_nowait(make_message("alice", "bob"))
+
+        blocked = asyncio.create_task(transport.send(make_message("alice", "bob", b"late")))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+        await transport.receive("bob")
+        await blocked
+        assert transport.pending() == 2
+        with pytest.raises(asyncio.TimeoutError):
+            await transport.receive("alice", timeout=0.01)
+
+    asyncio.run(fill())
+
+def test_unknown_receiver_rejected():
+    network = CommunicationNetwork()
+    network.add_person(Person("alice"))
+    transport = InProcessTransport(network)
+    with pytest.raises(ValueError):
+        transport.send_nowait(make_message("alice", "mallory"))
+
+def test_many_concurrent_coroutines():
+    people = [f"p{i}" for i in range(200)]
+
+    async def simulate():
+        transport = InProcessTransport(maxsize=8)
+
+        async def sender(index):
+            for round_number in range(25):
+                await transport.send(make_message(people[index], people[(index + round_number) % len(people)]))
+
+        async def receiver(person_id):
+            return [await transport.receive(person_id) for _ in range(25)]
+
+        results = await asyncio.gather(*(receiver(person_id) for person_id in people),
+                                       *(sender(index) for index in range(len(people))))
+        return transport, results[:len(people)]
+
+    transport, inboxes = asyncio.run(simulate())
+    assert sum(len(inbox) for inbox in inboxes) == 200 * 25
+    assert transport.latency_stats().count == 200 * 25
@@ -0,0 +1,118 @@
+import os
+
+import pytest
+from structures import Person, Message, MessageMetadata, MessageType
+from message_log import MessageLog, LogPosition
+
+def make_message(sender, receiver, message_type=MessageType.PLAIN, body="hello"):
+    return Message(Person(sender), Person(receiver), MessageMetadata(message_type=message_type), body)
+
+@pytest.fixture
+def messages():
+    return [
+        make_message("alice", "bob", MessageType.SIGNED, "signed 1"),
+        make_message("alice", "carol"),
+        make_message("bob", "alice", MessageType.SIGNED, b"signed 2"),
+        make_message("alice", "bob", MessageType.SIGNED, "signed 3"),
+    ]
+
+def test_append_and_query(tmp_path, messages):
+    with MessageLog(str(tmp_path)) as log:
+        positions = log.append_many(messages)
+        assert positions[0] == LogPosition(0, 0)
+        assert len(log) == 4
+
+        signed_from_alice = [frame.text() for frame in log.query(sender_id="alice", message_type=MessageType.SIGNED)]
+        assert signed_from_alice == ["signed 1", "signed 3"]
+        assert [frame.message.sender_id for frame in log.query(receiver_id="alice")] == ["bob"]
+        assert list(log.query(sender_id="nobody")) == []
+        assert bytes(log.read(positions[2]).message.body) == b"signed 2"
+
+def test_reopen_rebuilds_index(tmp_path, messages):
+    with MessageLog(str(tmp_path)) as log:
+        log.append_many(messages)
+    with MessageLog(str(tmp_path)) as log:
+        assert len(log) == 4
+        assert len(list(log.query(sender_id="alice"))) == 3
+        log.append(make_message("carol", "alice"))
+        assert [frame.message.sender_id for frame in log.query(receiver_id="alice")] == ["bob", "carol"]
+
+def test_torn_write_is_dropped(tmp_path, messages):
+    with MessageLog(str(tmp_path)) as log:
+        log.append_many(messages)
+    segment = tmp_path / "00000000.log"
+    data = segment.read_bytes()
+    segment.write_bytes(data[:-3])
+
+    with MessageLog(str(tmp_path)) as log:
+        assert len(log) == 3
+        log.append(messages[3])
+        assert [frame.text() for frame in log.query(message_type=MessageType.SIGNED) if frame.body_is_text] == \
+            ["signed 1", "signed 3"]
+
+def test_rotation(tmp_path, messages):
+    with MessageLog(str(tmp_path), segment_size=100) as log:
+        log.append_many(messages * 3)
+        assert len(log.segments) > 1
+        assert len(list(log)) == 12
+        assert len(list(log.query(sender_id="bob"))) == 3
+
+def test_compaction(tmp_path, messages):
+    with MessageLog(str(tmp_path), segment_size=100) as log:
+        log.append_many(messages * 3)
+        log.rotate()
+        segment_count = len(log.segments)
+
+        reclaimed = log.compact(keep=lambda frame: frame.message.metadata.message_type == MessageType.SIGNED)
+        assert reclaimed > 0
+        assert len(log.segments) < segment_count
+        assert len(log) == 9
+        assert list(log.query(message_type=MessageType.PLAIN)) == []
+        assert len(list(log.query(sender_id="alice", message_type=MessageType.SIGNED))) == 6
+
+    with MessageLog(str(tmp_path)) as log:
+        assert len(log) == 9
+
+def test_compaction_with_smaller_segment_size(tmp_path, messages):
+    with MessageLog(str(tmp_path), segment_size=10000) as log:
+        log.append_many(messages * 3)
+        log.rotate()
+        log.append(make_message("carol", "alice"))
+
+    # Reopened with a smaller segment size, the one sealed segment compacts into many
+    with MessageLog(str(tmp_path), segment_size=100) as log:
+        log.compact()
+        assert len(log.segments) > 2
+        assert log.segments == sorted(log.segments)
+        assert len(log) == 13
+        assert [frame.message.sender_id for frame in log.query(receiver_id="alice")] == ["bob"] * 3 + ["carol"]
+        log.append(make_message("dave", "alice"))
+    assert not [name for name in os.listdir(tmp_path) if not name.endswith(".log")]
+
+    with MessageLog(str(tmp_path)) as log:
+        assert len(log) == 14
+        assert [frame.message.sender_id for frame in log][-2:] == ["carol", "dave"]
+
+def test_unfinished_compaction_is_resolved_on_open(tmp_path, messages):
+    with MessageLog(str(tmp_path), segment_size=100) as log:
+        log.append_many(messages * 3)
+        log.rotate()
+    # A compaction that crashed before committing leaves only its output files behind
+    (tmp_path / "00000000.log.compact").write_bytes(b"partial")
+    with MessageLog(str(tmp_path)) as log:
+        assert len(log) == 12
+    assert not (tmp_path / "00000000.log.compact").exists()
+
+def test_committed_compaction_is_replayed_on_open(tmp_path, messages, monkeypatch):
+    with MessageLog(str(tmp_path), segment_size=100) as log:
+        log.append_many(messages * 3)
+        log.rotate()
+        # Crash right after the manifest commits, before any segment is swapped
+        monkeypatch.setattr(MessageLog, "_apply_compaction", lambda self, plan: None)
+        log.compact(keep=lambda frame: frame.message.metadata.message_type == MessageType.SIGNED)
+        monkeypatch.undo()
+
+    with MessageLog(str(tmp_path)) as log:
+        assert len(log) == 9
+        assert len(list(log.query(sender_id="alice", message_type=MessageType.SIGNED))) == 6
+    assert not [name for name in os.listdir(tmp_path) if not name.endswith(".log")]
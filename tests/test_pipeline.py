@@ -0,0 +1,85 @@
+import os
+import pytest
+from structures import CommunicationNetwork, Person, MessageType
+from pipeline import Pipeline, CompressStage, select_codec
+from signed_messages import generate_key_pair
+from wire import decode_message, encode_message
+
+@pytest.fixture(scope="module")
+def keys():
+    return generate_key_pair(), generate_key_pair()
+
+@pytest.fixture
+def network(keys):
+    network = CommunicationNetwork()
+    (alice_private, alice_public), (bob_private, bob_public) = keys
+    network.add_person(Person("alice", public_key=alice_public, private_key=alice_private))
+    network.add_person(Person("bob", public_key=bob_public, private_key=bob_private))
+    network.add_connection("alice", "bob")
+    return network
+
+def test_select_codec():
+    assert select_codec(b"A" * 500 + b"B" * 500).codec == "rle"
+    assert select_codec(os.urandom(5000)).codec == "none"
+    assert select_codec(b"AAAA").codec == "none"
+    prose = ("The quick brown fox jumps over the lazy dog. " * 40).encode()
+    assert select_codec(prose).codec == "none"
+    assert select_codec(prose, is_text=True, allow_lossy=True).codec == "fft"
+    assert select_codec(os.urandom(5000)).entropy > 7.5
+
+def test_select_codec_entropy_cutoff(monkeypatch):
+    import pipeline
+    # Every byte value in runs of four: maximal entropy, yet RLE still pays off
+    choice = select_codec(bytes(value for value in range(256) for _ in range(4)) * 4)
+    assert choice.entropy > pipeline.ENTROPY_CUTOFF and choice.codec == "rle"
+
+    # Run-free printable noise (about 6.6 bits per byte) flips with the cutoff, even for lossy text
+    noise = bytes(byte % 95 + 32 for byte in os.urandom(20000))
+    assert select_codec(noise, is_text=True, allow_lossy=True).codec == "fft"
+    monkeypatch.setattr(pipeline, "ENTROPY_CUTOFF", 6.0)
+    assert select_codec(noise, is_text=True, allow_lossy=True).codec == "none"
+
+def test_full_pipeline_round_trip(network):
+    pipeline = Pipeline(network)
+    body = "A" * 300 + "B" * 300 + " tail"
+    message = pipeline.send("alice", "bob", body)
+
+    stack = message.metadata.additional_data["pipeline"]
+    assert [entry["stage"] for entry in stack] == ["compress", "sign", "encrypt"]
+    assert stack[0]["codec"] == "rle"
+    assert message.metadata.message_type == MessageType.ENCRYPTED
+    assert message.metadata.compression_ratio < 0.1
+    assert pipeline.receive(message) == body
+
+    # The stack survives the wire format
+    frame, _ = decode_message(encode_message(message))
+    message.metadata = frame.message.metadata.to_metadata()
+    assert pipeline.receive(message) == body
+
+def test_incompressible_body_is_not_expanded(network):
+    body = os.urandom(4096)
+    message = Pipeline(network, [CompressStage(codec="rle")]).send("alice", "bob", body)
+    assert message.metadata.additional_data["pipeline"][0]["codec"] == "none"
+    assert message.body == body
+    assert message.metadata.message_type == MessageType.PLAIN
+
+def test_tampering_detected(network):
+    pipeline = Pipeline(network, ["compress", "sign"])
+    message = pipeline.send("alice", "bob", b"payload" * 20)
+    message.body = message.body[:-1] + b"!"
+    with pytest.raises(ValueError):
+        pipeline.receive(message)
+
+def test_lossy_fft_stage(network):
+    pipeline = Pipeline(network, [CompressStage(allow_lossy=True)])
+    body = "Lossy text " * 30
+    message = pipeline.send("alice", "bob", body)
+    assert message.metadata.message_type == MessageType.FFT_COMPRESSED
+    assert len(message.body) < len(body)
+    assert len(pipeline.receive(message)) == len(body)
+
+def test_invalid_stages(network):
+    with pytest.raises(ValueError):
+        Pipeline(network, ["zip"])
+    with pytest.raises(ValueError):
+        CompressStage(codec="lz4")
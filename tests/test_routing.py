@@ -0,0 +1,80 @@
+import pytest
+from structures import CommunicationNetwork, Person, Message, MessageMetadata, MessageType
+from routing import DeliveryEngine, LinkModel
+from wire import encoded_size
+
+@pytest.fixture
+def network():
+    network = CommunicationNetwork()
+    for person_id in ["alice", "bob", "carol", "dave", "eve"]:
+        network.add_person(Person(person_id))
+    network.add_connection("alice", "bob")
+    network.add_connection("bob", "carol")
+    network.add_connection("carol", "dave")
+    return network
+
+def make_message(network, sender_id, receiver_id, body="hello"):
+    return Message(network.get_person(sender_id), network.get_person(receiver_id),
+                   MessageMetadata(message_type=MessageType.PLAIN), body)
+
+def test_delivers_along_path(network):
+    engine = DeliveryEngine(network, LinkModel(latency=1.0))
+    message = make_message(network, "alice", "dave")
+    assert engine.submit(message) == ["alice", "bob", "carol", "dave"]
+
+    deliveries = engine.run()
+    assert len(deliveries) == 1
+    assert deliveries[0].message is message
+    assert deliveries[0].delivered_at == pytest.approx(3.0)
+    assert engine.stats().hops == 3
+    assert engine.stats().rounds == 3
+
+def test_bandwidth_serializes_shared_links(network):
+    engine = DeliveryEngine(network, LinkModel(latency=0.0, bandwidth=100.0))
+    first = make_message(network, "alice", "carol", "x" * 50)
+    second = make_message(network, "alice", "bob", "y" * 50)
+    engine.submit_many([first, second])
+    engine.run()
+
+    first_size, second_size = encoded_size(first), encoded_size(second)
+    delivered = {delivery.message.receiver.id: delivery.delivered_at for delivery in engine.deliveries}
+    # Both share the alice-bob link, so the second waits for the first
+    assert delivered["bob"] == pytest.approx((first_size + second_size) / 100.0)
+    assert delivered["carol"] == pytest.approx(2 * first_size / 100.0)
+
+def test_links_transmit_in_ready_order(network):
+    engine = DeliveryEngine(network, LinkModel(latency=0.0, bandwidth=100.0))
+    # Queued at bob first, but not ready to leave until t=10
+    late = make_message(network, "bob", "carol", "x" * 50)
+    early = make_message(network, "alice", "carol", "y" * 50)
+    engine.submit(late, sent_at=10.0)
+    engine.submit(early)
+    engine.run()
+
+    late_size, early_size = encoded_size(late), encoded_size(early)
+    delivered = {delivery.message.sender.id: delivery.delivered_at for delivery in engine.deliveries}
+    # early reaches bob long before t=10, so it must not wait behind late on bob-carol
+    assert delivered["alice"] == pytest.approx(2 * early_size / 100.0)
+    assert delivered["bob"] == pytest.approx(10.0 + late_size / 100.0)
+
+def test_per_link_models(network):
+    slow = {("bob", "carol"): LinkModel(latency=5.0)}
+    engine = DeliveryEngine(network, lambda a, b: slow.get((a, b), LinkModel(latency=1.0)))
+    engine.submit(make_message(network, "alice", "dave"))
+    assert engine.run()[0].delivered_at == pytest.approx(7.0)
+
+def test_batch_size_limits_each_step(network):
+    engine = DeliveryEngine(network, batch_size=2)
+    engine.submit_many(make_message(network, "alice", "bob") for _ in range(5))
+    assert engine.step() == 2
+    assert engine.in_flight == 3
+    engine.run()
+    assert engine.stats().delivered == 5
+    assert engine.stats().max_queue_depth == 5
+
+def test_self_delivery_and_unreachable(network):
+    engine = DeliveryEngine(network)
+    assert engine.submit(make_message(network, "alice", "alice")) == ["alice"]
+    assert engine.in_flight == 0
+    with pytest.raises(ValueError):
+        engine.submit(make_message(network, "alice", "eve"))
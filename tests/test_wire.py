@@ -0,0 +1,95 @@
+import pytest
+from structures import (
+    Person,
+    Message,
+    MessageMetadata,
+    MessageType,
+    CompactMessage,
+    MESSAGE_TYPE_CODES,
+    MESSAGE_TYPES_BY_CODE
+)
+from wire import (
+    HEADER,
+    encode_message,
+    encode_message_into,
+    encoded_size,
+    decode_message,
+    iter_frames
+)
+
+@pytest.fixture
+def signed_message():
+    alice = Person("alice", public_key=b"public", private_key=b"private")
+    bob = Person("bob")
+    metadata = MessageMetadata(
+        message_type=MessageType.SIGNED,
+        original_length=5,
+        signature=b"\x01" * 256,
+        original_hash=b"\x02" * 32,
+        additional_data={"signature_algorithm": "rsa-pss", "prehashed": True, "stages": ["rle", 2, 0.5, None]}
+    )
+    return Message(sender=alice, receiver=bob, metadata=metadata, body="Hello")
+
+def test_round_trip(signed_message):
+    frame, end = decode_message(encode_message(signed_message))
+    message = frame.message
+
+    assert end == encoded_size(signed_message)
+    assert frame.body_is_text and frame.text() == "Hello"
+    assert (message.sender_id, message.receiver_id) == ("alice", "bob")
+    assert message.metadata.to_metadata() == signed_message.metadata
+
+def test_private_key_not_serialized(signed_message):
+    assert b"private" not in encode_message(signed_message)
+
+def test_decode_does_not_copy_body(signed_message):
+    signed_message.body = b"\x00binary\xff" * 100
+    data = encode_message(signed_message)
+    frame, _ = decode_message(data)
+
+    assert not frame.body_is_text
+    assert frame.message.body.obj is data
+    data[-1] = 0
+    assert frame.message.body[-1] == 0
+
+def test_encode_into_preallocated_buffer(signed_message):
+    compact = CompactMessage("bob", "alice", signed_message.metadata, b"reply")
+    buffer = bytearray(encoded_size(signed_message) + encoded_size(compact))
+    offset = encode_message_into(signed_message, buffer)
+    assert encode_message_into(compact, buffer, offset) == len(buffer)
+
+    frames = list(iter_frames(buffer))
+    assert [frame.message.sender_id for frame in frames] == ["alice", "bob"]
+    assert bytes(frames[1].message.body) == b"reply"
+
+    with pytest.raises(ValueError):
+        encode_message_into(signed_message, bytearray(10))
+
+def test_rejects_bad_frames(signed_message):
+    data = encode_message(signed_message)
+    with pytest.raises(ValueError):
+        decode_message(data[:HEADER.size - 1])
+    with pytest.raises(ValueError):
+        decode_message(data[:-1])
+    with pytest.raises(ValueError):
+        decode_message(b"XXXX" + bytes(data[4:]))
+
+def test_message_type_codes_are_pinned(signed_message):
+    # Codes are persisted in frames and logs; changing one breaks every stored message
+    assert MESSAGE_TYPE_CODES == {
+        MessageType.PLAIN: 0,
+        MessageType.RLE_COMPRESSED: 1,
+        MessageType.FFT_COMPRESSED: 2,
+        MessageType.ENCRYPTED: 3,
+        MessageType.SIGNED: 4,
+        MessageType.SIGN_CONFIRMATION: 5,
+    }
+    assert set(MESSAGE_TYPE_CODES) == set(MessageType)
+    assert all(MESSAGE_TYPES_BY_CODE[code] is message_type for message_type, code in MESSAGE_TYPE_CODES.items())
+
+    data = bytearray(encode_message(signed_message))
+    assert HEADER.unpack_from(data)[2] == 4
+    # The type code follows the 4-byte magic and the version byte
+    data[5] = 200
+    with pytest.raises(ValueError):
+        decode_message(data)
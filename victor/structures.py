@@ -1,8 +1,23 @@
+import csv
+import os
+import threading
+import time
+import tracemalloc
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+from collections.abc import Mapping
 from dataclasses import dataclass
-from typing import Dict, List, Any, Optional
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Set, Tuple, Union
 from enum import Enum
 import networkx as nx
 
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed by the "csr" graph backend
+    np = None
+
 class MessageType(Enum):
     PLAIN = "plain"
     RLE_COMPRESSED = "rle_compressed"
@@ -33,26 +48,1006 @@ class Message:
     metadata: MessageMetadata
     body: str
 
-class CommunicationNetwork:
+# Slotted, immutable counterparts for holding many messages in memory. Compact
+# messages refer to people by ID instead of holding Person objects (and keys).
+
+@dataclass(frozen=True, slots=True)
+class CompactPerson:
+    id: str
+    public_key: Optional[bytes] = None
+    
+    @classmethod
+    def from_person(cls, person: Person) -> "CompactPerson":
+        return cls(person.id, person.public_key)
+
+@dataclass(frozen=True, slots=True)
+class CompactMessageMetadata:
+    message_type: MessageType
+    original_length: Optional[int] = None
+    compression_ratio: Optional[float] = None
+    signature: Optional[bytes] = None
+    original_hash: Optional[bytes] = None
+    additional_data: Optional[Dict[str, Any]] = None
+    
+    @classmethod
+    def from_metadata(cls, metadata: MessageMetadata) -> "CompactMessageMetadata":
+        return cls(metadata.message_type, metadata.original_length, metadata.compression_ratio,
+                   metadata.signature, metadata.original_hash, metadata.additional_data)
+    
+    def to_metadata(self) -> MessageMetadata:
+        return MessageMetadata(self.message_type, self.original_length, self.compression_ratio,
+                               self.signature, self.original_hash, self.additional_data)
+
+@dataclass(frozen=True, slots=True)
+class CompactMessage:
+    sender_id: str
+    receiver_id: str
+    metadata: CompactMessageMetadata
+    body: Union[str, bytes, memoryview]
+    
+    @classmethod
+    def from_message(cls, message: Message) -> "CompactMessage":
+        return cls(message.sender.id, message.receiver.id,
+                   CompactMessageMetadata.from_metadata(message.metadata), message.body)
+    
+    def to_message(self, network: "CommunicationNetwork") -> Message:
+        """Resolve the sender and receiver IDs back to the network's Person objects."""
+        body = self.body.tobytes() if isinstance(self.body, memoryview) else self.body
+        return Message(network.get_person(self.sender_id), network.get_person(self.receiver_id),
+                       self.metadata.to_metadata(), body)
+
+# One-byte codes written by wire frames and message logs; they are persisted,
+# so never renumber a member, and give new members unused codes
+MESSAGE_TYPE_CODES = {
+    MessageType.PLAIN: 0,
+    MessageType.RLE_COMPRESSED: 1,
+    MessageType.FFT_COMPRESSED: 2,
+    MessageType.ENCRYPTED: 3,
+    MessageType.SIGNED: 4,
+    MessageType.SIGN_CONFIRMATION: 5,
+}
+MESSAGE_TYPES_BY_CODE = {code: message_type for message_type, code in MESSAGE_TYPE_CODES.items()}
+
+class MessageBatch:
+    """Columnar store for many messages: per-message index and length arrays plus one body buffer.
+
+    Build it with from_messages(); it is immutable afterwards, so indexing
+    returns MessageView objects whose bodies are memoryview slices of the
+    shared buffer rather than copies.
+    """
+    def __init__(self, person_ids: List[str], senders: array, receivers: array, type_codes: array,
+                 original_lengths: array, offsets: array, text_flags: array, buffer: bytes,
+                 extra_metadata: Dict[int, CompactMessageMetadata]):
+        self.person_ids = person_ids
+        self.senders = senders
+        self.receivers = receivers
+        self.type_codes = type_codes
+        # -1 where the metadata has no original length
+        self.original_lengths = original_lengths
+        # Body i is buffer[offsets[i]:offsets[i + 1]]
+        self.offsets = offsets
+        # 1 where the body was a str (stored as UTF-8)
+        self.text_flags = text_flags
+        self.buffer = buffer
+        # Metadata beyond type and length (signatures, hashes, ...) for the messages that have it
+        self.extra_metadata = extra_metadata
+    
+    @classmethod
+    def from_messages(cls, messages: Iterable[Union[Message, CompactMessage]]) -> "MessageBatch":
+        person_index: Dict[str, int] = {}
+        person_ids: List[str] = []
+        senders, receivers = array("i"), array("i")
+        type_codes, text_flags = array("B"), array("B")
+        original_lengths, offsets = array("q"), array("q", [0])
+        buffer = bytearray()
+        extra_metadata: Dict[int, CompactMessageMetadata] = {}
+    
+        def intern(person_id: str) -> int:
+            if person_id not in person_index:
+                person_index[person_id] = len(person_ids)
+                person_ids.append(person_id)
+            return person_index[person_id]
+    
+        for index, message in enumerate(messages):
+            if isinstance(message, Message):
+                message = CompactMessage.from_message(message)
+            body = message.body
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+                text_flags.append(1)
+            elif isinstance(body, (bytes, bytearray, memoryview)):
+                text_flags.append(0)
+            else:
+                raise TypeError(f"Message bodies must be str or bytes, not {type(body).__name__}.")
+            senders.append(intern(message.sender_id))
+            receivers.append(intern(message.receiver_id))
+            metadata = message.metadata
+            type_codes.append(MESSAGE_TYPE_CODES[metadata.message_type])
+            original_lengths.append(-1 if metadata.original_length is None else metadata.original_length)
+            buffer += body
+            offsets.append(len(buffer))
+            if (metadata.compression_ratio is not None or metadata.signature is not None
+                    or metadata.original_hash is not None or metadata.additional_data is not None):
+                extra_metadata[index] = metadata
+        return cls(person_ids, senders, receivers, type_codes, original_lengths, offsets, text_flags,
+                   bytes(buffer), extra_metadata)
+    
+    def __len__(self) -> int:
+        return len(self.senders)
+    
+    def __getitem__(self, index: int) -> "MessageView":
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("MessageBatch index out of range")
+        return MessageView(self, index)
+    
+    def __iter__(self) -> Iterator["MessageView"]:
+        return (MessageView(self, index) for index in range(len(self)))
+    
+    def body_view(self, index: int) -> memoryview:
+        return memoryview(self.buffer)[self.offsets[index]:self.offsets[index + 1]]
+
+class MessageView:
+    """One message of a MessageBatch, read from the columns on access."""
+    __slots__ = ("batch", "index")
+    
+    def __init__(self, batch: MessageBatch, index: int):
+        self.batch = batch
+        self.index = index
+    
+    @property
+    def sender_id(self) -> str:
+        return self.batch.person_ids[self.batch.senders[self.index]]
+    
+    @property
+    def receiver_id(self) -> str:
+        return self.batch.person_ids[self.batch.receivers[self.index]]
+    
+    @property
+    def message_type(self) -> MessageType:
+        return MESSAGE_TYPES_BY_CODE[self.batch.type_codes[self.index]]
+    
+    @property
+    def metadata(self) -> CompactMessageMetadata:
+        extra = self.batch.extra_metadata.get(self.index)
+        if extra is not None:
+            return extra
+        original_length = self.batch.original_lengths[self.index]
+        return CompactMessageMetadata(self.message_type, None if original_length < 0 else original_length)
+    
+    @property
+    def body(self) -> memoryview:
+        """The raw body bytes (UTF-8 for text bodies), without copying."""
+        return self.batch.body_view(self.index)
+    
+    @property
+    def is_text(self) -> bool:
+        return bool(self.batch.text_flags[self.index])
+    
+    def text(self) -> str:
+        return str(self.body, "utf-8")
+    
+    def to_compact(self) -> CompactMessage:
+        return CompactMessage(self.sender_id, self.receiver_id, self.metadata,
+                              self.text() if self.is_text else self.body)
+    
+    def to_message(self, network: "CommunicationNetwork") -> Message:
+        return self.to_compact().to_message(network)
+
+StageSnapshot = namedtuple("StageSnapshot", ["count", "seconds", "bytes", "peak_memory", "buckets"])
+
+# Upper bounds (seconds) of the timing histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS = (1e-6, 1e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 0.5, 1.0, 5.0)
+
+class _StageTimer:
+    """One timed execution of a stage; use via Metrics.stage."""
+    __slots__ = ("metrics", "name", "nbytes", "start", "memory")
+
+    def __init__(self, metrics: "Metrics", name: str, nbytes: int):
+        self.metrics = metrics
+        self.name = name
+        self.nbytes = nbytes
+
+    def add_bytes(self, nbytes: int):
+        self.nbytes += nbytes
+
+    def __enter__(self) -> "_StageTimer":
+        self.memory = self.metrics._memory_enter() if self.metrics.trace_memory else None
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        peak = self.metrics._memory_exit(self.memory) if self.memory is not None else 0
+        self.metrics._record(self.name, elapsed, self.nbytes, peak)
+
+class _NullStage:
+    """Shared stand-in returned while metrics are disabled."""
+    __slots__ = ()
+
+    def add_bytes(self, nbytes: int):
+        pass
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class Metrics:
+    """Opt-in per-stage timing histograms, call counts, byte counts and tracemalloc peaks.
+
+    Disabled by default; stage() then returns a shared no-op, so
+    instrumented code pays one attribute check per stage.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self._lock = threading.Lock()
+        self._stages: Dict[str, list] = {}
+        self._local = threading.local()
+        # Whether enable() started tracemalloc, so disable() stops only tracing it owns
+        self._started_tracing = False
+
+    def enable(self, trace_memory: bool = False):
+        """Start recording; trace_memory also captures each stage's tracemalloc peak (slow)."""
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self.trace_memory = trace_memory
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording, and stop tracemalloc if enable() started it."""
+        self.enabled = False
+        self.trace_memory = False
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def stage(self, name: str, nbytes: int = 0):
+        """Context manager timing one execution of the named stage."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _StageTimer(self, name, nbytes)
+
+    def snapshot(self) -> Dict[str, StageSnapshot]:
+        """Stage name -> totals so far, with cumulative (upper bound, count) histogram buckets."""
+        with self._lock:
+            stages = {name: list(record) for name, record in self._stages.items()}
+        snapshot = {}
+        for name, (count, seconds, nbytes, peak, buckets) in sorted(stages.items()):
+            cumulative = []
+            running = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS + (float("inf"),), buckets):
+                running += bucket_count
+                cumulative.append((bound, running))
+            snapshot[name] = StageSnapshot(count, seconds, nbytes, peak, tuple(cumulative))
+        return snapshot
+
+    def to_prometheus(self, prefix: str = "messaging") -> str:
+        """Render the snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = [f"# HELP {prefix}_stage_seconds Time spent per stage execution.",
+                 f"# TYPE {prefix}_stage_seconds histogram"]
+        for name, stage in snapshot.items():
+            for bound, count in stage.buckets:
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{le}"}} {count}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stage.seconds!r}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stage.count}')
+        lines += [f"# HELP {prefix}_stage_bytes_total Bytes processed per stage.",
+                  f"# TYPE {prefix}_stage_bytes_total counter"]
+        lines += [f'{prefix}_stage_bytes_total{{stage="{name}"}} {stage.bytes}' for name, stage in snapshot.items()]
+        lines += [f"# HELP {prefix}_stage_peak_memory_bytes Largest tracemalloc peak seen in one stage execution.",
+                  f"# TYPE {prefix}_stage_peak_memory_bytes gauge"]
+        lines += [f'{prefix}_stage_peak_memory_bytes{{stage="{name}"}} {stage.peak_memory}'
+                  for name, stage in snapshot.items()]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str, prefix: str = "messaging"):
+        """Write the metrics for a textfile collector, replacing the file atomically."""
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as handle:
+            handle.write(self.to_prometheus(prefix))
+        os.replace(temporary, path)
+
+    def _record(self, name: str, seconds: float, nbytes: int, peak: int):
+        bucket = bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            record = self._stages.get(name)
+            if record is None:
+                record = self._stages[name] = [0, 0.0, 0, 0, [0] * (len(LATENCY_BUCKETS) + 1)]
+            record[0] += 1
+            record[1] += seconds
+            record[2] += nbytes
+            record[3] = max(record[3], peak)
+            record[4][bucket] += 1
+
+    def _memory_enter(self) -> list:
+        # reset_peak is global, so fold the peak so far into every open outer stage first
+        open_stages = self._open_stages()
+        current, peak = tracemalloc.get_traced_memory()
+        for frame in open_stages:
+            frame[1] = max(frame[1], peak)
+        tracemalloc.reset_peak()
+        frame = [current, current]
+        open_stages.append(frame)
+        return frame
+
+    def _memory_exit(self, frame: list) -> int:
+        open_stages = self._open_stages()
+        _, peak = tracemalloc.get_traced_memory()
+        if open_stages and open_stages[-1] is frame:
+            open_stages.pop()
+        for outer in open_stages:
+            outer[1] = max(outer[1], peak)
+        return max(frame[1], peak) - frame[0]
+
+    def _open_stages(self) -> list:
+        stages = getattr(self._local, "stages", None)
+        if stages is None:
+            stages = self._local.stages = []
+        return stages
+
+# Process-wide registry shared by every messenger and CommunicationNetwork
+METRICS = Metrics()
+
+class DisjointSet:
+    """Union-find over node IDs with path halving and union by size."""
+    def __init__(self):
+        self.parent: Dict[str, str] = {}
+        self.size: Dict[str, int] = {}
+    
+    def add(self, item: str):
+        if item not in self.parent:
+            self.parent[item] = item
+            self.size[item] = 1
+    
+    def find(self, item: str) -> str:
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+    
+    def union(self, item1: str, item2: str):
+        root1 = self.find(item1)
+        root2 = self.find(item2)
+        if root1 == root2:
+            return
+        if self.size[root1] < self.size[root2]:
+            root1, root2 = root2, root1
+        self.parent[root2] = root1
+        self.size[root1] += self.size.pop(root2)
+    
+    def groups(self) -> List[Set[str]]:
+        members: Dict[str, Set[str]] = {}
+        for item in self.parent:
+            members.setdefault(self.find(item), set()).add(item)
+        return list(members.values())
+
+class NodeArrayMap(Mapping):
+    """Read-only node ID -> value view over a per-node integer array (-1 = absent)."""
+    def __init__(self, graph: "CSRGraph", values, as_node: bool = False):
+        self.graph = graph
+        self.values = values
+        # When as_node is set, values are node indices (-2 = None) and are mapped back to IDs
+        self.as_node = as_node
+    
+    def __getitem__(self, node_id: str):
+        idx = self.graph._index.get(node_id)
+        if idx is None or idx >= len(self.values) or self.values[idx] == -1:
+            raise KeyError(node_id)
+        value = int(self.values[idx])
+        if self.as_node:
+            return self.graph._ids[value] if value >= 0 else None
+        return value
+    
+    def __iter__(self) -> Iterator[str]:
+        ids = self.graph._ids
+        return (ids[idx] for idx in np.flatnonzero(self.values != -1))
+    
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.values != -1))
+
+class CSRGraph:
+    """Undirected graph with integer-interned nodes and CSR adjacency arrays.
+
+    Implements the subset of the networkx.Graph API that CommunicationNetwork
+    uses. Edge edits are buffered and merged into the arrays on the next read,
+    so it suits large graphs that are loaded once and queried many times.
+    """
+    COMPACT_THRESHOLD = 4096
+    
     def __init__(self):
-        self.graph = nx.Graph()
+        if np is None:
+            raise ImportError("The csr graph backend requires numpy.")
+        self._index: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int32)
+        self._num_edges = 0
+        # Pending edits as (low, high) index pairs, merged by _compact()
+        self._added: Set[Tuple[int, int]] = set()
+        self._removed: Set[Tuple[int, int]] = set()
+    
+    def __contains__(self, node_id) -> bool:
+        return node_id in self._index
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._index))
+    
+    def __len__(self) -> int:
+        return len(self._index)
+    
+    def number_of_nodes(self) -> int:
+        return len(self._index)
+    
+    def number_of_edges(self) -> int:
+        self._compact()
+        return self._num_edges
+    
+    @property
+    def edges(self) -> Iterator[Tuple[str, str]]:
+        self._compact()
+        ids = self._ids
+        rows = np.repeat(np.arange(self.indptr.size - 1), np.diff(self.indptr))
+        canonical = rows <= self.indices
+        return ((ids[u], ids[v]) for u, v in zip(rows[canonical].tolist(), self.indices[canonical].tolist()))
+    
+    def add_node(self, node_id: str):
+        if node_id not in self._index:
+            self._index[node_id] = len(self._ids)
+            self._ids.append(node_id)
+    
+    def add_nodes_from(self, node_ids: Iterable[str]):
+        for node_id in node_ids:
+            self.add_node(node_id)
+    
+    def add_edges_from(self, edges: Iterable[Tuple[str, str]]):
+        """Merge a batch of edges into the CSR arrays with a single rebuild."""
+        add_node = self.add_node
+        index = self._index
+        rows, cols = [], []
+        for node1_id, node2_id in edges:
+            idx1 = index.get(node1_id)
+            if idx1 is None:
+                add_node(node1_id)
+                idx1 = index[node1_id]
+            idx2 = index.get(node2_id)
+            if idx2 is None:
+                add_node(node2_id)
+                idx2 = index[node2_id]
+            rows.append(idx1)
+            cols.append(idx2)
+        if not rows:
+            return
+        self._compact()
+        rows = np.array(rows, dtype=np.int64)
+        cols = np.array(cols, dtype=np.int64)
+        old_rows, old_cols = self._canonical_edges()
+        self._set_edges(len(self._ids),
+                        np.concatenate([old_rows, np.minimum(rows, cols)]),
+                        np.concatenate([old_cols, np.maximum(rows, cols)]))
+    
+    def add_edge(self, node1_id: str, node2_id: str):
+        self.add_node(node1_id)
+        self.add_node(node2_id)
+        key = self._key(self._index[node1_id], self._index[node2_id])
+        if key in self._removed:
+            self._removed.discard(key)
+        elif not self._has_compacted_edge(*key):
+            self._added.add(key)
+        self._maybe_compact()
+    
+    def has_edge(self, node1_id: str, node2_id: str) -> bool:
+        idx1 = self._index.get(node1_id)
+        idx2 = self._index.get(node2_id)
+        if idx1 is None or idx2 is None:
+            return False
+        key = self._key(idx1, idx2)
+        if key in self._added:
+            return True
+        return key not in self._removed and self._has_compacted_edge(*key)
+    
+    def remove_edge(self, node1_id: str, node2_id: str):
+        if not self.has_edge(node1_id, node2_id):
+            raise nx.NetworkXError(f"The edge {node1_id}-{node2_id} is not in the graph")
+        key = self._key(self._index[node1_id], self._index[node2_id])
+        if key in self._added:
+            self._added.discard(key)
+        else:
+            self._removed.add(key)
+            self._maybe_compact()
+    
+    def remove_node(self, node_id: str):
+        if node_id not in self._index:
+            raise nx.NetworkXError(f"The node {node_id} is not in the graph.")
+        self._compact()
+        idx = self._index.pop(node_id)
+        for neighbour in self.indices[self.indptr[idx]:self.indptr[idx + 1]].tolist():
+            self._removed.add(self._key(idx, neighbour))
+        # The slot is left as a tombstone so other indices stay valid
+        self._ids[idx] = None
+        self._compact()
+    
+    def neighbors(self, node_id: str) -> Iterator[str]:
+        if node_id not in self._index:
+            raise nx.NetworkXError(f"The node {node_id} is not in the graph.")
+        self._compact()
+        idx = self._index[node_id]
+        ids = self._ids
+        return (ids[v] for v in self.indices[self.indptr[idx]:self.indptr[idx + 1]].tolist())
+    
+    def bfs_tree(self, source: str) -> Tuple[NodeArrayMap, NodeArrayMap]:
+        """Level-synchronous BFS over the CSR arrays, returning (pred, dist) views."""
+        self._compact()
+        n = len(self._ids)
+        src = self._index[source]
+        dist = np.full(n, -1, dtype=np.int32)
+        pred = np.full(n, -1, dtype=np.int32)
+        dist[src] = 0
+        pred[src] = -2
+        frontier = np.array([src], dtype=np.int64)
+        level = 0
+        while frontier.size:
+            level += 1
+            frontier = self._expand(frontier, pred, dist, level)
+        return NodeArrayMap(self, pred, as_node=True), NodeArrayMap(self, dist)
+    
+    def bidirectional_path(self, source: str, target: str) -> List[str]:
+        """Shortest path by BFS from both ends, expanding the cheaper frontier each round; [] if none."""
+        self._compact()
+        n = len(self._ids)
+        src, dst = self._index[source], self._index[target]
+        if src == dst:
+            return [source]
+        preds, dists, frontiers, levels = [], [], [], [0, 0]
+        for root in (src, dst):
+            dist = np.full(n, -1, dtype=np.int32)
+            pred = np.full(n, -1, dtype=np.int32)
+            dist[root] = 0
+            pred[root] = -2
+            preds.append(pred)
+            dists.append(dist)
+            frontiers.append(np.array([root], dtype=np.int64))
+    
+        indptr = self.indptr
+        while frontiers[0].size and frontiers[1].size:
+            # Whole levels at a time, so the first level where the searches meet holds a shortest path
+            degrees = [int((indptr[frontier + 1] - indptr[frontier]).sum()) for frontier in frontiers]
+            side = 0 if degrees[0] <= degrees[1] else 1
+            levels[side] += 1
+            frontiers[side] = self._expand(frontiers[side], preds[side], dists[side], levels[side])
+            other_dist = dists[1 - side]
+            meet = frontiers[side][other_dist[frontiers[side]] != -1]
+            if meet.size:
+                middle = int(meet[np.argmin(other_dist[meet])])
+                halves = []
+                for pred in preds:
+                    half = [middle]
+                    while pred[half[-1]] != -2:
+                        half.append(int(pred[half[-1]]))
+                    halves.append(half)
+                return [self._ids[idx] for idx in halves[0][::-1] + halves[1][1:]]
+        return []
+    
+    def _expand(self, frontier, pred, dist, level: int):
+        """Label the unseen neighbours of frontier with level and a parent; returns them as the next frontier."""
+        starts = self.indptr[frontier]
+        counts = self.indptr[frontier + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            return frontier[:0]
+        # Gather every neighbour slot of the frontier in one fancy-indexing pass
+        offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+        neighbours = self.indices[offsets]
+        parents = np.repeat(frontier, counts)
+        unseen = dist[neighbours] == -1
+        neighbours, first = np.unique(neighbours[unseen], return_index=True)
+        dist[neighbours] = level
+        pred[neighbours] = parents[unseen][first]
+        return neighbours.astype(np.int64)
+    
+    @staticmethod
+    def _key(idx1: int, idx2: int) -> Tuple[int, int]:
+        return (idx1, idx2) if idx1 <= idx2 else (idx2, idx1)
+    
+    def _has_compacted_edge(self, idx1: int, idx2: int) -> bool:
+        if idx1 >= self.indptr.size - 1:
+            return False
+        row = self.indices[self.indptr[idx1]:self.indptr[idx1 + 1]]
+        pos = np.searchsorted(row, idx2)
+        return bool(pos < row.size and row[pos] == idx2)
+    
+    def _maybe_compact(self):
+        if len(self._added) + len(self._removed) > max(self.COMPACT_THRESHOLD, self.indices.size // 4):
+            self._compact()
+    
+    def _compact(self):
+        n = len(self._ids)
+        if not self._added and not self._removed:
+            # Only new, isolated nodes: extend indptr instead of rebuilding
+            if self.indptr.size < n + 1:
+                self.indptr = np.concatenate([self.indptr, np.full(n + 1 - self.indptr.size, self.indptr[-1])])
+            return
+        rows, cols = self._canonical_edges()
+        if self._removed:
+            removed = np.array(list(self._removed), dtype=np.int64)
+            keep = ~np.isin(rows * n + cols, removed[:, 0] * n + removed[:, 1])
+            rows, cols = rows[keep], cols[keep]
+        if self._added:
+            added = np.array(list(self._added), dtype=np.int64)
+            rows = np.concatenate([rows, added[:, 0]])
+            cols = np.concatenate([cols, added[:, 1]])
+        self._set_edges(n, rows, cols)
+        self._added.clear()
+        self._removed.clear()
+    
+    def _canonical_edges(self):
+        # Each stored edge once, as (low, high) index arrays
+        rows = np.repeat(np.arange(self.indptr.size - 1, dtype=np.int64), np.diff(self.indptr))
+        cols = self.indices.astype(np.int64)
+        canonical = rows <= cols
+        return rows[canonical], cols[canonical]
+    
+    def _set_edges(self, n: int, rows, cols):
+        # Store both directions (self-loops once), sorted by row then column, without duplicates
+        loops = rows == cols
+        all_rows = np.concatenate([rows, cols[~loops]])
+        all_cols = np.concatenate([cols, rows[~loops]])
+        order = np.lexsort((all_cols, all_rows))
+        all_rows, all_cols = all_rows[order], all_cols[order]
+        if all_rows.size:
+            keep = np.ones(all_rows.size, dtype=bool)
+            keep[1:] = (all_rows[1:] != all_rows[:-1]) | (all_cols[1:] != all_cols[:-1])
+            all_rows, all_cols = all_rows[keep], all_cols[keep]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(all_rows, minlength=n), out=self.indptr[1:])
+        self.indices = all_cols.astype(np.int32)
+        self._num_edges = int((all_cols.size + np.count_nonzero(all_rows == all_cols)) // 2)
+
+RouteCacheInfo = namedtuple("RouteCacheInfo", ["hits", "misses", "invalidations", "currsize", "maxsize",
+                                               "nodes", "maxnodes"])
+
+# A cached BFS tree: predecessor and hop distance for every node reachable from the source
+RouteTree = Tuple[Mapping, Mapping]
+
+GRAPH_BACKENDS = {
+    "networkx": nx.Graph,
+    "csr": CSRGraph,
+}
+
+class CommunicationNetwork:
+    # Uncached sources remembered for cache admission; a source's tree is cached on its second miss
+    ROUTE_HISTORY_SIZE = 4096
+
+    def __init__(self, route_cache_size: Optional[int] = 64, backend: str = "networkx", key_pool=None,
+                 route_cache_nodes: Optional[int] = 1_000_000):
+        if backend not in GRAPH_BACKENDS:
+            raise ValueError(f"Unknown graph backend {backend!r}; expected one of {sorted(GRAPH_BACKENDS)}.")
+        self.backend = backend
+        self.graph = GRAPH_BACKENDS[backend]()
         self.people: Dict[str, Person] = {}
+        # Optional source of pre-generated keys (anything with get() -> (private, public))
+        self.key_pool = key_pool
+        # BFS trees keyed by source, least recently used first (None = unbounded, 0 = disabled).
+        # A tree holds an entry per reachable node (a full array on csr), so besides the tree
+        # count the cache is bounded by route_cache_nodes entries in total (None = unbounded).
+        self.route_cache_size = route_cache_size
+        self.route_cache_nodes = route_cache_nodes
+        self._routes: "OrderedDict[str, RouteTree]" = OrderedDict()
+        self._route_nodes = 0
+        # Sources that missed once; one-off queries use a bidirectional search instead of a full tree
+        self._route_history: "OrderedDict[str, None]" = OrderedDict()
+        self._route_hits = 0
+        self._route_misses = 0
+        self._route_invalidations = 0
+        # Connectivity index; union-find cannot split sets, so deletions mark it for rebuild
+        self._components = DisjointSet()
+        self._components_stale = False
     
     def add_person(self, person: Person):
+        self._assign_pooled_keys(person)
+        # A new node is isolated, so no cached tree can reach it yet
         self.people[person.id] = person
         self.graph.add_node(person.id)
+        self._components.add(person.id)
     
     def add_connection(self, person1_id: str, person2_id: str):
-        if person1_id in self.people and person2_id in self.people:
-            self.graph.add_edge(person1_id, person2_id)
+        # Query paths check the flag directly; a no-op context manager costs as much as the lookup
+        if METRICS.enabled:
+            with METRICS.stage("network.add_connection"):
+                return self._add_connection(person1_id, person2_id)
+        return self._add_connection(person1_id, person2_id)
+    
+    def add_people_bulk(self, people: Iterable[Person]):
+        """Add many people at once."""
+        people = list(people)
+        for person in people:
+            self._assign_pooled_keys(person)
+        self.people.update((person.id, person) for person in people)
+        self.graph.add_nodes_from(person.id for person in people)
+        for person in people:
+            self._components.add(person.id)
+    
+    def add_connections_bulk(self, connections, strict: bool = False,
+                             batch_size: int = 100_000) -> List[Tuple[str, str]]:
+        """Add many connections, validated in batches, and return those whose endpoints are unknown.
+
+        connections is an iterable of (person1_id, person2_id) pairs or an (N, 2)
+        NumPy array of IDs. With strict=True nothing is inserted when any endpoint
+        is unknown; a ValueError summarising the offenders is raised instead.
+        """
+        if np is not None and isinstance(connections, np.ndarray):
+            if connections.ndim != 2 or connections.shape[1] != 2:
+                raise ValueError(f"Expected an (N, 2) edge array, got shape {connections.shape}.")
+            # Sorted once per call and searched per batch; matches map back to the
+            # existing ID objects, whose hashes the graph's dicts have already cached
+            ids = np.array(list(self.people), dtype=object)
+            names = ids.astype(str)
+            order = np.argsort(names)
+            known = (names[order], ids[order])
+        else:
+            known = None
+    
+        invalid: List[Tuple[str, str]] = []
+        pending = []
+        for batch in _batched(connections, batch_size):
+            valid, rejected = self._split_connections(batch, known)
+            invalid.extend(rejected)
+            pending.append(valid)
+    
+        if strict and invalid:
+            raise ValueError(f"{len(invalid)} connections reference people not in the network, "
+                             f"e.g. {invalid[:5]}.")
+        # One insert for the whole load; the csr backend rebuilds its arrays on every call
+        if any(pending):
+            self._insert_connections(chain.from_iterable(pending))
+        return invalid
+    
+    def add_connections_from_csv(self, path: str, delimiter: str = ",", has_header: bool = False,
+                                 strict: bool = False, batch_size: int = 100_000) -> List[Tuple[str, str]]:
+        """Load connections from the first two columns of a CSV file; see add_connections_bulk."""
+        with open(path, newline="") as handle:
+            reader = csv.reader(handle, delimiter=delimiter)
+            if has_header:
+                next(reader, None)
+            # A row missing its second column is reported as invalid like any unknown ID
+            rows = ((row[0], row[1]) if len(row) >= 2 else (row[0], "") for row in reader if row)
+            return self.add_connections_bulk(rows, strict=strict, batch_size=batch_size)
+    
+    def remove_connection(self, person1_id: str, person2_id: str):
+        if self.graph.has_edge(person1_id, person2_id):
+            self._invalidate_routes_for_removed_edge(person1_id, person2_id)
+            self.graph.remove_edge(person1_id, person2_id)
+            self._components_stale = True
+    
+    def remove_person(self, person_id: str):
+        if person_id in self.people:
+            self._invalidate_routes_through(person_id)
+            del self.people[person_id]
+            self.graph.remove_node(person_id)
+            self._components_stale = True
     
     def get_person(self, person_id: str) -> Optional[Person]:
         return self.people.get(person_id)
     
     def are_connected(self, person1_id: str, person2_id: str) -> bool:
-        return nx.has_path(self.graph, person1_id, person2_id)
+        if person1_id not in self.graph or person2_id not in self.graph:
+            raise nx.NodeNotFound(f"Either source {person1_id} or target {person2_id} is not in G")
+        if METRICS.enabled:
+            with METRICS.stage("network.are_connected"):
+                return self._are_connected(person1_id, person2_id)
+        return self._are_connected(person1_id, person2_id)
+    
+    def connected_components(self) -> List[Set[str]]:
+        """Return the groups of people that can reach each other."""
+        return self._component_index().groups()
     
     def get_path(self, person1_id: str, person2_id: str) -> List[str]:
-        if self.are_connected(person1_id, person2_id):
-            return nx.shortest_path(self.graph, person1_id, person2_id)
-        return []
\ No newline at end of file
+        if person1_id not in self.graph or person2_id not in self.graph:
+            raise nx.NodeNotFound(f"Either source {person1_id} or target {person2_id} is not in G")
+        if METRICS.enabled:
+            with METRICS.stage("network.get_path"):
+                return self._get_path(person1_id, person2_id)
+        return self._get_path(person1_id, person2_id)
+    
+    def spanning_tree(self, source_id: str) -> RouteTree:
+        """Return the BFS tree from source_id as (predecessor, hop distance) mappings, via the route cache."""
+        if source_id not in self.graph:
+            raise nx.NodeNotFound(f"Source {source_id} is not in G")
+        return self._route_tree(source_id)
+    
+    def route_cache_info(self) -> RouteCacheInfo:
+        """Report route cache hits, misses, invalidations and occupancy."""
+        return RouteCacheInfo(self._route_hits, self._route_misses, self._route_invalidations,
+                              len(self._routes), self.route_cache_size, self._route_nodes, self.route_cache_nodes)
+    
+    def clear_route_cache(self):
+        """Drop every cached route, e.g. after mutating self.graph directly."""
+        self._route_invalidations += len(self._routes)
+        self._routes.clear()
+        self._route_nodes = 0
+        self._route_history.clear()
+    
+    def _add_connection(self, person1_id: str, person2_id: str):
+        if person1_id in self.people and person2_id in self.people:
+            if not self.graph.has_edge(person1_id, person2_id):
+                self._invalidate_routes_for_new_edge(person1_id, person2_id)
+            self.graph.add_edge(person1_id, person2_id)
+            if not self._components_stale:
+                self._components.union(person1_id, person2_id)
+    
+    def _are_connected(self, person1_id: str, person2_id: str) -> bool:
+        components = self._component_index()
+        return components.find(person1_id) == components.find(person2_id)
+    
+    def _get_path(self, person1_id: str, person2_id: str) -> List[str]:
+        tree = self._routes.get(person1_id)
+        if tree is None and not self._admit_route(person1_id):
+            # A one-off source: a bidirectional search touches far fewer nodes than a full tree
+            self._route_misses += 1
+            if METRICS.enabled:
+                with METRICS.stage("network.bidirectional_search"):
+                    return self._bidirectional_path(person1_id, person2_id)
+            return self._bidirectional_path(person1_id, person2_id)
+        pred, dist = self._route_tree(person1_id)
+        if person2_id not in dist:
+            return []
+        path = [person2_id]
+        while path[-1] != person1_id:
+            path.append(pred[path[-1]])
+        path.reverse()
+        return path
+    
+    def _assign_pooled_keys(self, person: Person):
+        if self.key_pool is not None and person.private_key is None and person.public_key is None:
+            person.private_key, person.public_key = self.key_pool.get()
+    
+    def _split_connections(self, batch, known) -> Tuple[list, List[Tuple[str, str]]]:
+        if known is not None:
+            names, ids = known
+            batch = batch.astype(str)
+            if not names.size:
+                return [], [tuple(pair) for pair in batch.tolist()]
+            positions = np.minimum(np.searchsorted(names, batch), names.size - 1)
+            mask = (names[positions] == batch).all(axis=1)
+            # Tuples of strings drop out of the cyclic GC; lists would keep it busy during insertion
+            valid = ids[positions[mask]]
+            rejected = [tuple(pair) for pair in batch[~mask].tolist()]
+            return list(zip(valid[:, 0].tolist(), valid[:, 1].tolist())), rejected
+        people = self.people
+        valid, rejected = [], []
+        for person1_id, person2_id in batch:
+            if person1_id in people and person2_id in people:
+                valid.append((person1_id, person2_id))
+            else:
+                rejected.append((person1_id, person2_id))
+        return valid, rejected
+    
+    def _insert_connections(self, connections: Iterable[Tuple[str, str]]):
+        # Per-edge invalidation would cost more than rebuilding on demand
+        with METRICS.stage("network.add_connections_bulk"):
+            self.graph.add_edges_from(connections)
+        self.clear_route_cache()
+        self._components_stale = True
+    
+    def _component_index(self) -> DisjointSet:
+        if self._components_stale:
+            components = DisjointSet()
+            for node in self.graph:
+                components.add(node)
+            for person1_id, person2_id in self.graph.edges:
+                components.union(person1_id, person2_id)
+            self._components = components
+            self._components_stale = False
+        return self._components
+    
+    def _route_tree(self, source: str) -> RouteTree:
+        tree = self._routes.get(source)
+        if tree is not None:
+            self._route_hits += 1
+            self._routes.move_to_end(source)
+            return tree
+        self._route_misses += 1
+        with METRICS.stage("network.bfs"):
+            tree = self._bfs_tree(source)
+        if self.route_cache_size != 0:
+            self._routes[source] = tree
+            self._route_nodes += _tree_nodes(tree)
+            while self._routes and ((self.route_cache_size is not None and len(self._routes) > self.route_cache_size)
+                                    or (self.route_cache_nodes is not None and self._route_nodes > self.route_cache_nodes)):
+                self._route_nodes -= _tree_nodes(self._routes.popitem(last=False)[1])
+        return tree
+    
+    def _admit_route(self, source: str) -> bool:
+        """Whether a missed source has been seen recently enough to earn a cached tree."""
+        if self.route_cache_size == 0:
+            return False
+        if source in self._route_history:
+            self._route_history.move_to_end(source)
+            return True
+        self._route_history[source] = None
+        if len(self._route_history) > self.ROUTE_HISTORY_SIZE:
+            self._route_history.popitem(last=False)
+        return False
+    
+    def _bidirectional_path(self, person1_id: str, person2_id: str) -> List[str]:
+        if isinstance(self.graph, CSRGraph):
+            return self.graph.bidirectional_path(person1_id, person2_id)
+        try:
+            return nx.bidirectional_shortest_path(self.graph, person1_id, person2_id)
+        except nx.NetworkXNoPath:
+            return []
+    
+    def _bfs_tree(self, source: str) -> RouteTree:
+        if isinstance(self.graph, CSRGraph):
+            return self.graph.bfs_tree(source)
+        pred: Dict[str, Optional[str]] = {source: None}
+        dist = {source: 0}
+        adj = self.graph.adj
+        frontier = [source]
+        while frontier:
+            next_frontier = []
+            for node in frontier:
+                hops = dist[node] + 1
+                for neighbour in adj[node]:
+                    if neighbour not in dist:
+                        dist[neighbour] = hops
+                        pred[neighbour] = node
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        return pred, dist
+    
+    def _drop_routes(self, sources: List[str]):
+        for source in sources:
+            self._route_nodes -= _tree_nodes(self._routes.pop(source))
+        self._route_invalidations += len(sources)
+    
+    def _invalidate_routes_for_new_edge(self, person1_id: str, person2_id: str):
+        # A new edge only changes a tree if it shortens a distance or reaches new nodes
+        stale = []
+        for source, (pred, dist) in self._routes.items():
+            d1 = dist.get(person1_id)
+            d2 = dist.get(person2_id)
+            if d1 is None and d2 is None:
+                continue
+            if d1 is None or d2 is None or abs(d1 - d2) > 1:
+                stale.append(source)
+        self._drop_routes(stale)
+    
+    def _invalidate_routes_for_removed_edge(self, person1_id: str, person2_id: str):
+        # Removing a non-tree edge leaves every shortest path in the tree intact
+        stale = [source for source, (pred, dist) in self._routes.items()
+                 if pred.get(person1_id) == person2_id or pred.get(person2_id) == person1_id]
+        self._drop_routes(stale)
+    
+    def _invalidate_routes_through(self, person_id: str):
+        stale = [source for source, (pred, dist) in self._routes.items() if person_id in dist]
+        self._drop_routes(stale)
+
+def _tree_nodes(tree: RouteTree) -> int:
+    # csr trees are full per-node arrays, so they cost every node whatever they reach
+    dist = tree[1]
+    return dist.values.size if isinstance(dist, NodeArrayMap) else len(dist)
+
+def _batched(items, size: int):
+    if np is not None and isinstance(items, np.ndarray):
+        for start in range(0, len(items), size):
+            yield items[start:start + size]
+        return
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
\ No newline at end of file
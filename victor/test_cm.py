@@ -1,6 +1,20 @@
+import asyncio
 import unittest
 from structures import MessageType, Person, MessageMetadata, Message, CommunicationNetwork
-from compressed_messages import ExtendedCommunicationNetwork
+from compressed_messages import (
+    ExtendedCommunicationNetwork,
+    rle_encode,
+    rle_decode,
+    rle_encode_python,
+    rle_decode_python,
+    rle_encode_numpy,
+    rle_decode_numpy,
+    rle_encode_bytes,
+    rle_encode_stream,
+    rle_decode_stream,
+    RAW_BLOCK
+)
+import io
 
 class TestRLECompression(unittest.TestCase):
     def setUp(self):
@@ -84,5 +98,89 @@ class TestRLECompression(unittest.TestCase):
                 decoded = self.network.receive_rle_compressed_message(message)
                 self.assertEqual(decoded, test_str)
 
+    def test_vectorized_matches_python(self):
+        test_cases = [
+            "W" * 12 + "B" + "W" * 12 + "BBB" + "W" * 24 + "B" * 1000,
+            "The quick brown fox jumps over the lazy dog. " * 10,
+            "é€😀" * 30 + "€" * 77,
+            "AB" * 40 + " " * 12345,
+        ]
+
+        for test_str in test_cases:
+            with self.subTest(test_str=test_str[:20]):
+                encoded = rle_encode_numpy(test_str)
+                self.assertEqual(encoded, rle_encode_python(test_str))
+                self.assertEqual(encoded, rle_encode(test_str))
+                self.assertEqual(rle_decode_numpy(encoded), test_str)
+                self.assertEqual(rle_decode_numpy(encoded), rle_decode_python(encoded))
+                self.assertEqual(rle_decode(encoded), test_str)
+
+    def test_vectorized_decode_missing_count(self):
+        with self.assertRaises(ValueError):
+            rle_decode_numpy("3A" * 40 + "B")
+
+    def test_binary_mode_round_trip(self):
+        test_cases = [
+            "",
+            "111",  # Digits cannot round-trip through the text format
+            "2024-01-01 00000000 OK",
+            "\u00e9" * 50,
+            b"\x00" * 500 + bytes(range(256)) + b"\xff" * 3,
+        ]
+
+        for test_body in test_cases:
+            with self.subTest(test_body=test_body[:20]):
+                message = self.network.send_rle_compressed_message(
+                    sender_id="alice",
+                    receiver_id="bob",
+                    message_body=test_body,
+                    mode="binary"
+                )
+                self.assertEqual(message.metadata.additional_data["rle_mode"], "binary")
+                self.assertEqual(message.metadata.original_length, len(test_body))
+                self.assertEqual(self.network.receive_rle_compressed_message(message), test_body)
+
+    def test_binary_mode_raw_fallback(self):
+        payload = bytes(range(200))
+        encoded = rle_encode_bytes(payload)
+        self.assertEqual(encoded[0], RAW_BLOCK)
+        self.assertEqual(len(encoded), len(payload) + 1)
+
+        repetitive = b"A" * 1000
+        self.assertLess(len(rle_encode_bytes(repetitive)), 10)
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            self.network.send_rle_compressed_message("alice", "bob", "test", mode="gzip")
+
+    def test_stream_matches_whole_message(self):
+        test_str = "W" * 12 + "B" + "W" * 12 + "BBB" + "W" * 24 + "B" + "é" * 300 + "xyz"
+
+        for chunk_size in [1, 5, 12, 1000]:
+            with self.subTest(chunk_size=chunk_size):
+                encoded = "".join(rle_encode_stream(io.StringIO(test_str), chunk_size=chunk_size))
+                self.assertEqual(encoded, rle_encode(test_str))
+
+                pieces = [encoded[i:i + chunk_size] for i in range(0, len(encoded), chunk_size)]
+                self.assertEqual("".join(rle_decode_stream(pieces)), test_str)
+
+    def test_stream_decode_bounds_output(self):
+        chunks = list(rle_decode_stream(["100000", "0A2B"], max_output_chunk=4096))
+        self.assertTrue(all(len(chunk) <= 4096 for chunk in chunks))
+        self.assertEqual("".join(chunks), "A" * 1000000 + "BB")
+
+    def test_stream_message(self):
+        message = self.network.send_rle_compressed_stream(
+            "alice", "bob", ["AAA", "ABB", "B", "C"], chunk_size=2
+        )
+        self.assertTrue(message.metadata.additional_data["streamed"])
+        self.assertEqual(self.network.receive_rle_compressed_message(message), "AAAABBBC")
+
+    def test_async_round_trip(self):
+        async def round_trip():
+            message = await self.network.send_rle_compressed_message_async("alice", "bob", "AAABBB", mode="binary")
+            return await self.network.receive_rle_compressed_message_async(message)
+        self.assertEqual(asyncio.run(round_trip()), "AAABBB")
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
@@ -0,0 +1,269 @@
+"""Versioned binary framing for Message objects.
+
+A frame is a fixed header, the sender and receiver IDs, metadata as
+tag-length-value records, and the body:
+
+    header   magic "CNMF", version, type code, flags, reserved,
+             sender ID length (u16), receiver ID length (u16),
+             metadata length (u32), body length (u64); little-endian
+    ids      UTF-8 sender ID, UTF-8 receiver ID
+    metadata TLVs: tag (u8), length (u32), value
+    body     raw bytes (UTF-8 when the text flag is set)
+
+Unknown TLV tags are skipped so older readers can parse newer frames.
+"""
+import struct
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Sequence, Tuple, Union
+
+from structures import (
+    CompactMessage,
+    CompactMessageMetadata,
+    Message,
+    MessageType,
+    MESSAGE_TYPE_CODES,
+    MESSAGE_TYPES_BY_CODE
+)
+
+MAGIC = b"CNMF"
+WIRE_VERSION = 1
+HEADER = struct.Struct("<4sBBBBHHIQ")
+TLV_HEADER = struct.Struct("<BI")
+
+FLAG_TEXT_BODY = 0x01
+
+TAG_ORIGINAL_LENGTH = 1
+TAG_COMPRESSION_RATIO = 2
+TAG_SIGNATURE = 3
+TAG_ORIGINAL_HASH = 4
+TAG_ADDITIONAL_DATA = 5
+
+# Type markers for values inside the additional_data TLV
+VALUE_NONE, VALUE_FALSE, VALUE_TRUE, VALUE_INT, VALUE_FLOAT, VALUE_STR, VALUE_BYTES, VALUE_LIST, VALUE_DICT = range(9)
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+@dataclass(frozen=True, slots=True)
+class WireFrame:
+    """A decoded frame; message.body is a memoryview into the source buffer."""
+    message: CompactMessage
+    body_is_text: bool
+
+    def text(self) -> str:
+        return str(self.message.body, "utf-8")
+
+def encoded_size(message: Union[Message, CompactMessage]) -> int:
+    """Number of bytes encode_message_into will write for this message."""
+    return _frame_size(_prepare(message))
+
+def encode_message(message: Union[Message, CompactMessage]) -> bytearray:
+    parts = _prepare(message)
+    buffer = bytearray(_frame_size(parts))
+    _write(parts, buffer, 0)
+    return buffer
+
+def encode_message_into(message: Union[Message, CompactMessage], buffer: bytearray, offset: int = 0) -> int:
+    """Write one frame into a preallocated buffer at offset and return the offset after it."""
+    parts = _prepare(message)
+    size = _frame_size(parts)
+    if offset + size > len(buffer):
+        raise ValueError(f"Buffer too small: frame needs {size} bytes at offset {offset}, "
+                         f"buffer has {len(buffer) - offset}.")
+    return _write(parts, buffer, offset)
+
+def encode_batch(messages: Sequence[Union[Message, CompactMessage]]) -> Tuple[bytearray, List[int]]:
+    """Encode messages back-to-back into one buffer; returns it and each frame's end offset."""
+    prepared = [_prepare(message) for message in messages]
+    buffer = bytearray(sum(_frame_size(parts) for parts in prepared))
+    ends = []
+    offset = 0
+    for parts in prepared:
+        offset = _write(parts, buffer, offset)
+        ends.append(offset)
+    return buffer, ends
+
+def decode_message(data: Buffer, offset: int = 0) -> Tuple[WireFrame, int]:
+    """Parse the frame at offset without copying its body; returns (frame, offset after the frame)."""
+    view = memoryview(data).cast("B")
+    sender_id, receiver_id, message_type, end, flags, metadata_start, body_start = _decode_header(view, offset)
+    metadata = _decode_metadata(message_type, view[metadata_start:body_start])
+    message = CompactMessage(sender_id, receiver_id, metadata, view[body_start:end])
+    return WireFrame(message, bool(flags & FLAG_TEXT_BODY)), end
+
+def decode_envelope(data: Buffer, offset: int = 0) -> Tuple[str, str, MessageType, int]:
+    """Read only the routing fields of the frame at offset: (sender_id, receiver_id, message_type, end offset)."""
+    sender_id, receiver_id, message_type, end, _, _, _ = _decode_header(memoryview(data).cast("B"), offset)
+    return sender_id, receiver_id, message_type, end
+
+def iter_frames(data: Buffer) -> Iterator[WireFrame]:
+    """Decode back-to-back frames, e.g. a buffer filled by repeated encode_message_into calls."""
+    offset = 0
+    length = len(memoryview(data).cast("B"))
+    while offset < length:
+        frame, offset = decode_message(data, offset)
+        yield frame
+
+def _decode_header(view: memoryview, offset: int):
+    if len(view) - offset < HEADER.size:
+        raise ValueError("Truncated frame header.")
+    magic, version, type_code, flags, _, sender_length, receiver_length, metadata_length, body_length = \
+        HEADER.unpack_from(view, offset)
+    if magic != MAGIC:
+        raise ValueError("Not a message frame.")
+    if version != WIRE_VERSION:
+        raise ValueError(f"Unsupported frame version {version}.")
+    message_type = MESSAGE_TYPES_BY_CODE.get(type_code)
+    if message_type is None:
+        raise ValueError(f"Unknown message type code {type_code}.")
+
+    position = offset + HEADER.size
+    metadata_start = position + sender_length + receiver_length
+    body_start = metadata_start + metadata_length
+    end = body_start + body_length
+    if end > len(view):
+        raise ValueError("Truncated frame.")
+    sender_id = str(view[position:position + sender_length], "utf-8")
+    receiver_id = str(view[position + sender_length:metadata_start], "utf-8")
+    return sender_id, receiver_id, message_type, end, flags, metadata_start, body_start
+
+def _prepare(message: Union[Message, CompactMessage]):
+    if isinstance(message, Message):
+        sender_id, receiver_id = message.sender.id, message.receiver.id
+    else:
+        sender_id, receiver_id = message.sender_id, message.receiver_id
+    body = message.body
+    if isinstance(body, str):
+        flags = FLAG_TEXT_BODY
+        body = body.encode("utf-8")
+    elif isinstance(body, (bytes, bytearray, memoryview)):
+        flags = 0
+    else:
+        raise TypeError(f"Message bodies must be str or bytes, not {type(body).__name__}.")
+    sender = sender_id.encode("utf-8")
+    receiver = receiver_id.encode("utf-8")
+    if len(sender) > 0xFFFF or len(receiver) > 0xFFFF:
+        raise ValueError("Person IDs must be shorter than 64 KiB.")
+    metadata = message.metadata
+    return (MESSAGE_TYPE_CODES[metadata.message_type], flags, sender, receiver,
+            _encode_metadata(metadata), memoryview(body).cast("B"))
+
+def _frame_size(parts) -> int:
+    _, _, sender, receiver, metadata, body = parts
+    return HEADER.size + len(sender) + len(receiver) + len(metadata) + len(body)
+
+def _write(parts, buffer: bytearray, offset: int) -> int:
+    type_code, flags, sender, receiver, metadata, body = parts
+    HEADER.pack_into(buffer, offset, MAGIC, WIRE_VERSION, type_code, flags, 0,
+                     len(sender), len(receiver), len(metadata), len(body))
+    position = offset + HEADER.size
+    for part in (sender, receiver, metadata, body):
+        buffer[position:position + len(part)] = part
+        position += len(part)
+    return position
+
+def _encode_metadata(metadata) -> bytes:
+    records = bytearray()
+
+    def add(tag: int, value: bytes):
+        records.extend(TLV_HEADER.pack(tag, len(value)))
+        records.extend(value)
+
+    if metadata.original_length is not None:
+        add(TAG_ORIGINAL_LENGTH, struct.pack("<Q", metadata.original_length))
+    if metadata.compression_ratio is not None:
+        add(TAG_COMPRESSION_RATIO, struct.pack("<d", metadata.compression_ratio))
+    if metadata.signature is not None:
+        add(TAG_SIGNATURE, bytes(metadata.signature))
+    if metadata.original_hash is not None:
+        add(TAG_ORIGINAL_HASH, bytes(metadata.original_hash))
+    if metadata.additional_data is not None:
+        value = bytearray()
+        _encode_value(metadata.additional_data, value)
+        add(TAG_ADDITIONAL_DATA, bytes(value))
+    return bytes(records)
+
+def _decode_metadata(message_type, records: memoryview) -> CompactMessageMetadata:
+    fields = {}
+    position = 0
+    while position < len(records):
+        if len(records) - position < TLV_HEADER.size:
+            raise ValueError("Truncated metadata record.")
+        tag, length = TLV_HEADER.unpack_from(records, position)
+        position += TLV_HEADER.size
+        value = records[position:position + length]
+        if len(value) != length:
+            raise ValueError("Truncated metadata record.")
+        position += length
+        if tag == TAG_ORIGINAL_LENGTH:
+            fields["original_length"] = struct.unpack("<Q", value)[0]
+        elif tag == TAG_COMPRESSION_RATIO:
+            fields["compression_ratio"] = struct.unpack("<d", value)[0]
+        elif tag == TAG_SIGNATURE:
+            fields["signature"] = bytes(value)
+        elif tag == TAG_ORIGINAL_HASH:
+            fields["original_hash"] = bytes(value)
+        elif tag == TAG_ADDITIONAL_DATA:
+            fields["additional_data"], _ = _decode_value(value, 0)
+    return CompactMessageMetadata(message_type, **fields)
+
+def _encode_value(value: Any, out: bytearray):
+    if value is None:
+        out.append(VALUE_NONE)
+    elif isinstance(value, bool):
+        out.append(VALUE_TRUE if value else VALUE_FALSE)
+    elif isinstance(value, int):
+        out.append(VALUE_INT)
+        out.extend(struct.pack("<q", value))
+    elif isinstance(value, float):
+        out.append(VALUE_FLOAT)
+        out.extend(struct.pack("<d", value))
+    elif isinstance(value, (str, bytes, bytearray, memoryview)):
+        encoded = value.encode("utf-8") if isinstance(value, str) else bytes(value)
+        out.append(VALUE_STR if isinstance(value, str) else VALUE_BYTES)
+        out.extend(struct.pack("<I", len(encoded)))
+        out.extend(encoded)
+    elif isinstance(value, (list, tuple)):
+        out.append(VALUE_LIST)
+        out.extend(struct.pack("<I", len(value)))
+        for item in value:
+            _encode_value(item, out)
+    elif isinstance(value, dict):
+        out.append(VALUE_DICT)
+        out.extend(struct.pack("<I", len(value)))
+        for key, item in value.items():
+            if not isinstance(key, str):
+                raise TypeError("additional_data keys must be strings.")
+            _encode_value(key, out)
+            _encode_value(item, out)
+    else:
+        raise TypeError(f"Cannot serialize additional_data value of type {type(value).__name__}.")
+
+def _decode_value(data: memoryview, position: int) -> Tuple[Any, int]:
+    marker = data[position]
+    position += 1
+    if marker == VALUE_NONE:
+        return None, position
+    if marker in (VALUE_FALSE, VALUE_TRUE):
+        return marker == VALUE_TRUE, position
+    if marker == VALUE_INT:
+        return struct.unpack_from("<q", data, position)[0], position + 8
+    if marker == VALUE_FLOAT:
+        return struct.unpack_from("<d", data, position)[0], position + 8
+    (count,) = struct.unpack_from("<I", data, position)
+    position += 4
+    if marker in (VALUE_STR, VALUE_BYTES):
+        raw = data[position:position + count]
+        return (str(raw, "utf-8") if marker == VALUE_STR else bytes(raw)), position + count
+    if marker == VALUE_LIST:
+        items: List[Any] = []
+        for _ in range(count):
+            item, position = _decode_value(data, position)
+            items.append(item)
+        return items, position
+    if marker == VALUE_DICT:
+        mapping = {}
+        for _ in range(count):
+            key, position = _decode_value(data, position)
+            mapping[key], position = _decode_value(data, position)
+        return mapping, position
+    raise ValueError(f"Unknown additional_data value marker {marker}.")